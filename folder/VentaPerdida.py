@@ -4,9 +4,31 @@ import streamlit as st
 import plotly.express as px
 import numpy as np
 import plotly.graph_objects as go
-from io import BytesIO
-import requests 
 import plotly.io as pio
+import json
+import zlib
+import shutil
+import time
+import uuid
+from urllib.parse import urlencode
+# Internos de Streamlit que usa mostrar_grafica para enviar el JSON ya serializado; probados
+# con streamlit==1.38.0 (requirements.txt). Si no existen, se usa st.plotly_chart.
+try:
+    from streamlit.proto.PlotlyChart_pb2 import PlotlyChart as PlotlyChartProto
+    from streamlit.runtime.state.common import compute_widget_id
+except ImportError:
+    PlotlyChartProto = compute_widget_id = None
+import motor_venta_perdida as motor
+from motor_venta_perdida import (
+    csv_folder_url, venta_semanal_folder_url, master_github_url, version_de_datos,
+    IndiceMaster, IndiceOpciones, plazas_acacia, enriquecer, Consulta, filtrar,
+    UMBRAL_PARETO, DIMENSIONES_PARETO, pareto,
+    VENTANA_ZSCORE, UMBRAL_ZSCORE, DIMENSIONES_TENDENCIA,
+    estado_tendencia_vacio, tendencias_al_dia, media_movil_sobre_total, calcular_kpis,
+    riesgo_desabasto, HORIZONTE_RIESGO, VENTANA_RECURRENCIA,
+    FORMATOS_EXPORTACION, CONJUNTOS_EXPORTACION, generadores_exportacion, datos_exportacion, validar_exportacion,
+    guardar_exportacion, escribir_particiones, leer_particion,
+)
       
 st.set_page_config(page_title="Reporte de Venta Pérdida Cigarros y RRPS", page_icon="🚬", layout="wide", initial_sidebar_state="expanded")
 st.title("📊 Reporte de Venta Perdida Cigarros y RRPS 🚬")
@@ -18,45 +40,25 @@ kpi_top = st.container()
 # Función para obtener la lista de archivos en una carpeta de GitHub con URL raw
 @st.cache_data(ttl=3600)
 def list_files_in_github_folder(folder_url):
-    response = requests.get(folder_url)
-    response.raise_for_status()  # Verifica si la solicitud fue exitosa
-    files_info = response.json()
-
-    # Obtener las raw URLs
-    raw_urls = [file_info['download_url'] for file_info in files_info if file_info['type'] == 'file']
-    return raw_urls
+    return motor.list_files_in_github_folder(folder_url)
 
 # Función para descargar y leer archivos CSV y Excel desde GitHub (raw URLs)
 @st.cache_data(ttl=3600)
 def download_file_from_github(url):
-    response = requests.get(url)
-    response.raise_for_status()  # Verifica si la solicitud fue exitosa
-    return BytesIO(response.content)
-
-# URLs de las carpetas en GitHub usando la API (sin raw aún)
-csv_folder_url = 'https://api.github.com/repos/Edwinale20/Sdkiap/contents/Venta%20Perdida'
-venta_semanal_folder_url = 'https://api.github.com/repos/Edwinale20/Sdkiap/contents/Venta%20semanal'
-master_github_url = 'https://raw.githubusercontent.com/Edwinale20/Sdkiap/main/MASTER.xlsx'
+    return motor.download_file_from_github(url)
 
 # Obtener las URLs de los archivos CSV en la carpeta "Venta Perdida" (usando la API)
 csv_files = list_files_in_github_folder(csv_folder_url)
 
-# Descargar y leer todos los archivos CSV en un solo DataFrame con la codificación correcta
-csv_dataframes = []
-
-for file_url in csv_files:
-    try:
-        df = pd.read_csv(download_file_from_github(file_url), encoding='ISO-8859-1')
-        csv_dataframes.append(df)
-    except Exception as e:
-        st.warning(f"No se pudo descargar o leer: {file_url}")
-        st.error(e)
-
 # Obtener las URLs de los archivos Excel en la carpeta "Venta Semanal"
 venta_semanal = list_files_in_github_folder(venta_semanal_folder_url)
 
-# Cargar el archivo MASTER desde GitHub
-MASTER = pd.read_excel(download_file_from_github(master_github_url))
+# Versión de los datos: cambia cuando cambia la lista de archivos publicados en GitHub
+version_datos = version_de_datos(csv_files, venta_semanal)
+
+# Cargar el archivo MASTER desde GitHub e indexarlo por ARTICULO
+indice_master = IndiceMaster(pd.read_excel(download_file_from_github(master_github_url)))
+descripcion_articulo = indice_master.descripcion
 
 
 # Definir paleta de colores global 
@@ -70,177 +72,59 @@ pio.templates.default2 = "colors2"
 #---------------------------------------------------------------------
 @st.cache_data
 def venta_perdida(csv_files):
-    # Función para calcular la semana contable
-    def calcular_dia(fecha):
-        return fecha.isocalendar()[1]
-
-    combined_df = pd.DataFrame()  # Crear un DataFrame vacío para almacenar todos los datos
-
-    # Loop through each CSV file and append its contents to the combined dataframe
-    for csv_file in csv_files:
-        df = pd.read_csv(csv_file, encoding='ISO-8859-1')
-        
-        # Extraer el nombre del archivo sin la ruta completa y sin la extensión .csv
-        file_name = os.path.splitext(os.path.basename(csv_file))[0]
-        df['Día'] = file_name
-        
-        # Asumir que el nombre del archivo es la fecha en formato 'ddmmyyyy'
-        df['Fecha'] = pd.to_datetime(file_name, format='%d%m%Y', errors='coerce')
-        
-        # Calcular la semana contable
-        iso = df['Fecha'].dt.isocalendar()
-        df['Semana Contable'] = iso['year'].astype(str) + iso['week'].astype(str).astype(str).str.zfill(2)
-        
-        # Concatenar el DataFrame actual al DataFrame combinado
-        combined_df = pd.concat([combined_df, df])
-
-    # Eliminar las columnas no deseadas
-    combined_df = combined_df.drop(columns=['UPC','CAMPO', 'INVENTARIO_UDS','INVENTARIO_PESOS','VENTA_UDS_PTD','VENTA_PESOS_PTD','NUM_TIENDA','NOMBRE_TIENDA','ESTATUS', 'PROVEEDOR', 'Fecha', 'CATEGORIA'])
-    combined_df['DIVISION'] = combined_df['DIVISION'].astype(str).str[:2]
-    combined_df['PLAZA'] = combined_df['PLAZA'].astype(str).str[:3]
-    combined_df['MERCADO'] = combined_df['MERCADO'].astype(str).str[1:]
-    combined_df = combined_df.dropna(subset=['VENTA_PERDIDA_PESOS','ID_ARTICULO'])
-    combined_df['ID_ARTICULO'] = combined_df['ID_ARTICULO'].astype(float).astype(int).astype(str)
-    combined_df['VENTA_PERDIDA_PESOS'] = combined_df['VENTA_PERDIDA_PESOS'].round(0).astype('int64')
-    combined_df = combined_df.rename(columns={
-        'ID_ARTICULO': 'ARTICULO',
-    })
-
-    # Mover la columna 'Día' a la primera posición
-    cols = ['Día', 'Semana Contable'] + [col for col in combined_df.columns if col not in ['Día', 'Semana Contable']]
-    combined_df = combined_df[cols]
-    #combined_df = combined_df.drop(columns=['Día'])
-    return combined_df
+    return motor.venta_perdida(csv_files)
 
-#---------------------------------------------------------------------
 @st.cache_data
 def venta(venta_semanal):
-    concat_venta = pd.DataFrame()
+    return motor.venta(venta_semanal)
 
-    for xlsx_file in venta_semanal:
+#---------------------------------------------------------------------
+# Carga completa: todos los proveedores, enriquecidos con MASTER
+def preparar_datos():
+    # Descargar y leer todos los archivos CSV para avisar si alguno no se puede leer
+    for file_url in csv_files:
         try:
-            df2 = pd.read_excel(xlsx_file)
-            
-            # Verificar si ya existe la columna 'Semana Contable'
-            if 'Semana Contable' not in df2.columns:
-                print(f"Advertencia: La columna 'Semana Contable' no existe en {xlsx_file}.")
-                continue  # Salta este archivo si no tiene la columna necesaria
-            
-            # Asegúrate de que la columna 'Semana Contable' sea de tipo object
-            df2['Semana Contable'] = df2['Semana Contable'].astype(str)
-            
-            # Concatenar los datos
-            concat_venta = pd.concat([concat_venta, df2], ignore_index=True)
-        
+            pd.read_csv(download_file_from_github(file_url), encoding='ISO-8859-1')
         except Exception as e:
-            print(f"Error al procesar el archivo {xlsx_file}: {e}")
-    
-    # Reorganizar columnas si es necesario
-    if 'Semana Contable' in concat_venta.columns:
-        cols2 = ['Semana Contable'] + [col2 for col2 in concat_venta.columns if col2 not in ['Semana Contable']]
-        concat_venta = concat_venta[cols2]
-
-    # Eliminar columnas específicas no deseadas
-    columnas_a_eliminar = [col for col in concat_venta.columns if 'Unnamed' in col] + ['Metrics']
-    concat_venta = concat_venta.drop(columns=columnas_a_eliminar, errors='ignore') 
-    #concat_venta = concat_venta.dropna(subset=['Venta Neta Total', 'Artículo' ])
-    concat_venta['División'] = concat_venta['División'].astype(float).astype(int).astype(str)
-    concat_venta['Plaza'] = concat_venta['Plaza'].astype(float).astype(int).astype(str)
-    concat_venta['Mercado'] = concat_venta['Mercado'].astype(float).astype(int).astype(str)
-    concat_venta['Artículo'] = concat_venta['Artículo'].astype(float).astype(int).astype(str)
-    concat_venta['Semana Contable'] = concat_venta['Semana Contable'].astype('str')
-    concat_venta['Venta Neta Total'] = concat_venta['Venta Neta Total'].fillna(0).round(0).astype('int64')
-    concat_venta = concat_venta.rename(columns={
-        'Artículo': 'ARTICULO',
-        'División': 'DIVISION',
-        'Plaza': 'PLAZA', 
-        'Mercado': 'MERCADO',
-    })
- 
-    return concat_venta
-
+            st.warning(f"No se pudo descargar o leer: {file_url}")
+            st.error(e)
 
+    # Cargar los DataFrames por separado y enriquecerlos con MASTER
+    return enriquecer(venta_perdida(csv_files), venta(venta_semanal), indice_master)
 
 #---------------------------------------------------------------------
+# Particiones por proveedor: los datos preparados se guardan en disco, un archivo
+# Parquet por PROVEEDOR (según MASTER) y por tabla, bajo una carpeta por versión de datos.
+# Una sesión de proveedor (?proveedor=PMI en la URL o VENTA_PERDIDA_PROVEEDOR en el
+# entorno) lee solo su partición en lugar de cargar y enriquecer toda la cadena.
+DIRECTORIO_PARTICIONES = os.getenv(
+    'VENTA_PERDIDA_PARTICIONES',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'particiones'),
+)
+# Subir cuando cambie el esquema de los datos preparados, para no leer particiones viejas
+FORMATO_PARTICIONES = 4
+
+@st.cache_data(ttl=3600, show_spinner='Cargando datos del proveedor...')
+def datos_proveedor(proveedor, version_datos):
+    carpeta = os.path.join(DIRECTORIO_PARTICIONES, f'{version_datos}-v{FORMATO_PARTICIONES}')
+    if not os.path.isdir(carpeta):
+        # Primera sesión de esta versión: carga completa una sola vez para escribir las particiones
+        escribir_particiones(*preparar_datos(), carpeta)
+    return leer_particion(carpeta, proveedor)
+
+
+proveedor_sesion = st.query_params.get('proveedor') or os.getenv('VENTA_PERDIDA_PROVEEDOR')
+
+if proveedor_sesion:
+    proveedor_sesion = proveedor_sesion.strip().upper()
+    datos = datos_proveedor(proveedor_sesion, version_datos)
+    if datos is None:
+        st.error(f"No hay datos para el proveedor {proveedor_sesion}.")
+        st.stop()
+    VENTA_PERDIDA, VENTA = datos
+else:
+    VENTA_PERDIDA, VENTA = preparar_datos()
 
-# Cargar los DataFrames por separado
-VENTA_PERDIDA = venta_perdida(csv_files)
-VENTA = venta(venta_semanal)
-MASTER['ARTICULO'] = MASTER['ARTICULO'].astype(str)
-
-
-familia_dict = MASTER.set_index('ARTICULO')['FAMILIA'].to_dict()
-segmento_dict = MASTER.set_index('ARTICULO')['SEGMENTO'].to_dict()
-subcategoria_dict = MASTER.set_index('ARTICULO')['SUBCATEGORIA'].to_dict()
-proveedor_dict = MASTER.set_index('ARTICULO')['PROVEEDOR'].to_dict()
-
-VENTA_PERDIDA['FAMILIA'] = VENTA_PERDIDA['ARTICULO'].map(familia_dict)
-VENTA_PERDIDA['SEGMENTO'] = VENTA_PERDIDA['ARTICULO'].map(segmento_dict)
-VENTA_PERDIDA['SUBCATEGORIA'] = VENTA_PERDIDA['ARTICULO'].map(subcategoria_dict)
-VENTA_PERDIDA['PROVEEDOR'] = VENTA_PERDIDA['ARTICULO'].map(proveedor_dict)
-
-
-VENTA['FAMILIA'] = VENTA['ARTICULO'].map(familia_dict)
-VENTA['SEGMENTO'] = VENTA['ARTICULO'].map(segmento_dict)
-VENTA['SUBCATEGORIA'] = VENTA['ARTICULO'].map(subcategoria_dict)
-VENTA['PROVEEDOR'] = VENTA['ARTICULO'].map(proveedor_dict)
-
-VENTA_PERDIDA = VENTA_PERDIDA.dropna(subset=['PROVEEDOR'])
-
-
-# Diccionario de mapeo de códigos de plaza a nombres
-map_plaza = {
-    "100": "Reynosa",
-    "110": "Matamoros",
-    "200": "México",
-    "300": "Jalisco",
-    "400": "Coahuila (Saltillo)",
-    "410": "Coahuila (Torreón)",
-    "500": "Nuevo León",
-    "600": "Baja California (Tijuana)",
-    "610": "Baja California (Ensenada)",
-    "620": "Baja California (Mexicali)",
-    "650": "Sonora (Hermosillo)",
-    "700": "Puebla",
-    "720": "Morelos",
-    "800": "Yucatán",
-    "890": "Quintana Roo",
-}
-
-# Aplicar el mapeo al DataFrame
-VENTA['PLAZA'] = VENTA['PLAZA'].apply(lambda x: map_plaza.get(x, x))
-VENTA_PERDIDA['PLAZA'] = VENTA_PERDIDA['PLAZA'].apply(lambda x: map_plaza.get(x, x))
-
- 
-map_division = {
-    "10": "Coah-Tamps",
-    "20": "México-Península",
-    "30": "Pacífico",
-    "50": "Nuevo León",
-}
-
-# Aplicar el mapeo al DataFrame
-VENTA['DIVISION'] = VENTA['DIVISION'].map(map_division)
-VENTA_PERDIDA['DIVISION'] = VENTA_PERDIDA['DIVISION'].map(map_division)
-
-plazas_acacia = {
-    "100": "Reynosa",
-    "110": "Matamoros",
-    "200": "México",
-    "300": "Jalisco",
-    "400": "Coahuila (Saltillo)",
-    "410": "Coahuila (Torreón)",
-    "500": "Nuevo León",
-    "600": "Baja California (Tijuana)",
-    "610": "Baja California (Ensenada)",
-    "620": "Baja California (Mexicali)",
-    "650": "Sonora (Hermosillo)",
-    "700": "Puebla",
-    "720": "Morelos",
-    "800": "Yucatán",
-    "890": "Quintana Roo",
-}
- 
 
 # Calcular la suma de 'Venta Neta Total'
 if 'Venta Neta Total' in VENTA.columns:
@@ -252,93 +136,85 @@ else:
 #---------------------------------------------------------------------
 st.sidebar.image("https://raw.githubusercontent.com/Edwinale20/Sdkiap/main/folder/el-logo.png", width=170)
 st.sidebar.title("Filtros 🔠")
+if proveedor_sesion:
+    st.sidebar.caption(f"Sesión del proveedor {proveedor_sesion}")
+
+
+# Opciones en cascada: cada lista muestra solo valores que co-ocurren con los demás filtros
+# elegidos, según el índice de combinaciones (se arma una vez por versión de datos)
+@st.cache_resource(ttl=3600, show_spinner=False)
+def indice_opciones(proveedor_sesion, version_datos, _VENTA_PERDIDA, _VENTA):
+    return IndiceOpciones(_VENTA_PERDIDA, _VENTA)
+
+indice = indice_opciones(proveedor_sesion, version_datos, VENTA_PERDIDA, VENTA)
 
+def sin_filtro(valor):
+    return None if valor == 'Ninguno' else valor
+
+# Selección de la ejecución anterior, sin lo que ya no co-ocurre con los filtros de arriba
+seleccion = indice.depurar(Consulta(
+    proveedor=sin_filtro(st.session_state.get('filtro_proveedor', 'Ninguno')),
+    division=sin_filtro(st.session_state.get('filtro_division', 'Ninguno')),
+    plazas=tuple(st.session_state.get('filtro_plazas', [])) if st.session_state.get('filtro_tipo_plaza') == 'Plazas 🏪' else (),
+    mercado=sin_filtro(st.session_state.get('filtro_mercado', 'Ninguno')),
+    semana=sin_filtro(st.session_state.get('filtro_semana', 'Ninguno')),
+    familia=sin_filtro(st.session_state.get('filtro_familia', 'Ninguno')),
+    categoria=sin_filtro(st.session_state.get('filtro_categoria', 'Ninguno')),
+))
+
+def filtro_sidebar(etiqueta, campo, opciones):
+    # Las opciones cambian con los demás filtros; el índice conserva el valor elegido
+    valor = getattr(seleccion, campo)
+    return st.sidebar.selectbox(etiqueta, opciones, index=opciones.index(valor) if valor else 0, key=f'filtro_{campo}')
 
 # Paso 1: Crear una lista de opciones para el filtro, incluyendo "Ninguno"
-opciones_proveedor = ['Ninguno'] + list(VENTA_PERDIDA['PROVEEDOR'].unique())
-proveedor = st.sidebar.selectbox('Seleccione el Proveedor', opciones_proveedor)
+opciones_proveedor = ['Ninguno'] + indice.opciones(seleccion, 'proveedor')
+proveedor = filtro_sidebar('Seleccione el Proveedor', 'proveedor', opciones_proveedor)
 
-opciones_division = ['Ninguno'] + list(VENTA_PERDIDA['DIVISION'].unique())
-division = st.sidebar.selectbox('Seleccione la División', opciones_division)
+opciones_division = ['Ninguno'] + indice.opciones(seleccion, 'division')
+division = filtro_sidebar('Seleccione la División', 'division', opciones_division)
 
 # Paso 2 - Sidebar para elegir filtro
 tipo_filtro_acacia = st.sidebar.selectbox(
     'Seleccione la Plaza 🏪',
-    ['Total plazas', 'Plazas 🏪']
+    ['Total plazas', 'Plazas 🏪'],
+    key='filtro_tipo_plaza'
 )
 
 # Paso 3 - Mostrar multiselect solo si quiere filtrar
 if tipo_filtro_acacia == 'Plazas 🏪':
-    opciones_plaza_acacia = list(set(plazas_acacia.values()))
-    plazas_acacia_seleccionadas = st.sidebar.multiselect('Plazas 🏪', opciones_plaza_acacia)
+    opciones_plaza_acacia = [plaza for plaza in indice.opciones(seleccion, 'plazas') if plaza in plazas_acacia.values()]
+    plazas_acacia_seleccionadas = st.sidebar.multiselect('Plazas 🏪', opciones_plaza_acacia, default=[plaza for plaza in seleccion.plazas if plaza in opciones_plaza_acacia], key='filtro_plazas')
 else:
     plazas_acacia_seleccionadas = []  # No selecciona nada
 
 
-opciones_mercado = ['Ninguno'] + list(VENTA_PERDIDA['MERCADO'].unique())
-mercado = st.sidebar.selectbox('Seleccione el Mercado', opciones_mercado)
-
-opciones_semana = ['Ninguno'] + list(VENTA_PERDIDA['Semana Contable'].unique())
-semana = st.sidebar.selectbox('Seleccione la semana', opciones_semana)
-
-opciones_familia = ['Ninguno'] + list(VENTA_PERDIDA['FAMILIA'].unique())
-familia = st.sidebar.selectbox('Seleccione la Familia', opciones_familia)
-
-opciones_categoria = ['Ninguno'] + list(VENTA_PERDIDA['SUBCATEGORIA'].unique())
-categoria = st.sidebar.selectbox('Seleccione la Categoria', opciones_categoria)
-
-
-
-
-# Filtrar por Proveedor
-if proveedor == 'Ninguno':
-    df_venta_perdida_filtrada = VENTA_PERDIDA
-    df_venta_filtrada = VENTA
-else:
-    df_venta_perdida_filtrada = VENTA_PERDIDA[VENTA_PERDIDA['PROVEEDOR'] == proveedor]
-    df_venta_filtrada = VENTA[VENTA['PROVEEDOR'] == proveedor]
-
+opciones_mercado = ['Ninguno'] + indice.opciones(seleccion, 'mercado')
+mercado = filtro_sidebar('Seleccione el Mercado', 'mercado', opciones_mercado)
 
-# Filtrar por División
-if division != 'Ninguno':
-    df_venta_perdida_filtrada = df_venta_perdida_filtrada[df_venta_perdida_filtrada['DIVISION'] == division]
-    df_venta_filtrada = df_venta_filtrada[df_venta_filtrada['DIVISION'] == division]
+opciones_semana = ['Ninguno'] + indice.opciones(seleccion, 'semana')
+semana = filtro_sidebar('Seleccione la semana', 'semana', opciones_semana)
 
-# Paso 3 - Filtrar solo si seleccionó plazas
-if plazas_acacia_seleccionadas:
-    df_venta_perdida_filtrada = df_venta_perdida_filtrada[df_venta_perdida_filtrada['PLAZA'].isin(plazas_acacia_seleccionadas)]
-    df_venta_filtrada = df_venta_filtrada[df_venta_filtrada['PLAZA'].isin(plazas_acacia_seleccionadas)]
+opciones_familia = ['Ninguno'] + indice.opciones(seleccion, 'familia')
+familia = filtro_sidebar('Seleccione la Familia', 'familia', opciones_familia)
 
-# Filtrar por Mercado
-if mercado != 'Ninguno':
-    df_venta_perdida_filtrada = df_venta_perdida_filtrada[df_venta_perdida_filtrada['MERCADO'] == mercado]
-    df_venta_filtrada = df_venta_filtrada[df_venta_filtrada['MERCADO'] == mercado]
+opciones_categoria = ['Ninguno'] + indice.opciones(seleccion, 'categoria')
+categoria = filtro_sidebar('Seleccione la Categoria', 'categoria', opciones_categoria)
 
-# Filtrar por Semana
-if semana != 'Ninguno':
-    df_venta_perdida_filtrada = df_venta_perdida_filtrada[df_venta_perdida_filtrada['Semana Contable'] == semana]
-    df_venta_filtrada = df_venta_filtrada[df_venta_filtrada['Semana Contable'] == semana]
 
-# Filtrar por Familia
-if familia != 'Ninguno':
-    df_venta_perdida_filtrada = df_venta_perdida_filtrada[df_venta_perdida_filtrada['FAMILIA'] == familia]
-    df_venta_filtrada = df_venta_filtrada[df_venta_filtrada['FAMILIA'] == familia]
 
-# Filtrar por Categoria
-if categoria != 'Ninguno':
-    df_venta_perdida_filtrada = df_venta_perdida_filtrada[df_venta_perdida_filtrada['SUBCATEGORIA'] == categoria]
-    df_venta_filtrada = df_venta_filtrada[df_venta_filtrada['SUBCATEGORIA'] == categoria]
 
-
-# Modificar la columna 'Semana Contable' en ambos DataFrames
-# Semana Contable se queda como texto ordenable: YYYY-WWW (ej: 2025-W52, 2026-W01)
-for d in (df_venta_perdida_filtrada, df_venta_filtrada):
-    wk = pd.to_numeric(d['Semana Contable'], errors='coerce').astype('Int64')
-    s  = wk.astype(str).str.zfill(6)
-    d['Semana Contable'] = s.str[:4] + "-Sem " + s.str[-2:]
-
-df_venta_perdida_filtrada = df_venta_perdida_filtrada[df_venta_perdida_filtrada['FAMILIA'] != 'BYE']
-df_venta_filtrada = df_venta_filtrada[df_venta_filtrada['FAMILIA'] != 'BYE'] 
+# Filtrar con el motor ('Ninguno' es sin filtro)
+consulta = Consulta(
+    proveedor=sin_filtro(proveedor),
+    division=sin_filtro(division),
+    plazas=tuple(plazas_acacia_seleccionadas),
+    mercado=sin_filtro(mercado),
+    semana=sin_filtro(semana),
+    familia=sin_filtro(familia),
+    categoria=sin_filtro(categoria),
+)
+df_venta_perdida_filtrada, df_venta_filtrada = filtrar(VENTA_PERDIDA, VENTA, consulta)
 
 
 
@@ -346,8 +222,27 @@ df_venta_filtrada = df_venta_filtrada[df_venta_filtrada['FAMILIA'] != 'BYE']
 
 # Aplicar plantilla personalizada por defecto
 
+COLORES_SERIES = ['#00712D', '#FF9800', '#000080', '#FF6347', '#000000',
+                  '#FFD700', '#008080', '#FF7F50', '#006400', '#8B0000',
+                  '#FFCC66', '#33A85C', '#CD5C5C', '#FFA07A', '#2F4F4F']
+
+def agregar_media_movil(fig, df_tendencia, serie, color, etiqueta, mostrar_leyenda):
+    # Media móvil de 4 semanas de la serie, punteada y del color de su línea; una sola entrada de leyenda prende o apaga todas
+    df_serie = df_tendencia[df_tendencia['SERIE'] == serie]
+    fig.add_trace(go.Scatter(
+        x=df_serie['Semana Contable'],
+        y=df_serie['Media móvil 4 sem'],
+        mode='lines',
+        name='Media móvil 4 sem',
+        legendgroup='media_movil',
+        showlegend=mostrar_leyenda,
+        visible='legendonly',
+        line=dict(color=color, dash='dot'),
+        hovertemplate=f'<b>{etiqueta}:</b> {serie}<br><b>Media móvil 4 sem:</b> %{{y:.1f}}%<extra></extra>'
+    ))
+
 @st.cache_data
-def graficar_porcentaje_venta_perdida_por_semana(df_venta_filtrada, df_venta_perdida_filtrada):
+def graficar_porcentaje_venta_perdida_por_semana(df_venta_filtrada, df_venta_perdida_filtrada, df_tendencia=None):
     # Filtrar semanas comunes
     semanas_comunes = set(df_venta_filtrada['Semana Contable']).intersection(set(df_venta_perdida_filtrada['Semana Contable']))
     df_venta_filtrada_suma = df_venta_filtrada[df_venta_filtrada['Semana Contable'].isin(semanas_comunes)].groupby('Semana Contable')['Venta Neta Total'].sum().reset_index()
@@ -368,6 +263,17 @@ def graficar_porcentaje_venta_perdida_por_semana(df_venta_filtrada, df_venta_per
         textposition='top center'  # Posición de las etiquetas
     ))
 
+    # Línea de tendencia: media móvil de 4 semanas del motor de tendencias
+    if df_tendencia is not None and not df_tendencia.empty:
+        fig.add_trace(go.Scatter(
+            x=df_tendencia['Semana Contable'],
+            y=df_tendencia['Media móvil 4 sem'],
+            mode='lines',
+            name='Media móvil 4 sem',
+            line=dict(dash='dot'),
+            hovertemplate='Media móvil 4 sem: %{y:.2f}%<extra></extra>'
+        ))
+
     # Configurar el diseño de la gráfica
     fig.update_layout(
         title='Venta Perdida semanal 🗓️',
@@ -385,12 +291,10 @@ def graficar_porcentaje_venta_perdida_por_semana(df_venta_filtrada, df_venta_per
 
     return fig
 
-# Uso de la función
-figura = graficar_porcentaje_venta_perdida_por_semana(df_venta_filtrada, df_venta_perdida_filtrada)
 
 
 @st.cache_data
-def graficar_venta_perdida_por_proveedor_y_semana(df_venta_perdida_filtrada, df_venta_filtrada):
+def graficar_venta_perdida_por_proveedor_y_semana(df_venta_perdida_filtrada, df_venta_filtrada, df_tendencia=None):
     # Filtrar semanas comunes
     semanas_comunes = set(df_venta_filtrada['Semana Contable']).intersection(set(df_venta_perdida_filtrada['Semana Contable']))
     df_venta_perdida_filtrada_suma = df_venta_perdida_filtrada[df_venta_perdida_filtrada['Semana Contable'].isin(semanas_comunes)]
@@ -410,13 +314,14 @@ def graficar_venta_perdida_por_proveedor_y_semana(df_venta_perdida_filtrada, df_
 
     # Añadir una línea por cada proveedor
     proveedores = df_combined['PROVEEDOR'].unique()
-    for proveedor in proveedores:
+    for i, proveedor in enumerate(proveedores):
         df_proveedor = df_combined[df_combined['PROVEEDOR'] == proveedor]
         fig.add_trace(go.Scatter(
             x=df_proveedor['Semana Contable'],
             y=df_proveedor['% Venta Perdida'],
             mode='lines+markers',
             name=proveedor,
+            line=dict(color=COLORES_SERIES[i % len(COLORES_SERIES)]),
             hovertemplate=(
                 '%{x}<br>'
                 '% Venta Perdida: %{y:.2f}%<br>'
@@ -425,6 +330,8 @@ def graficar_venta_perdida_por_proveedor_y_semana(df_venta_perdida_filtrada, df_
             customdata=df_proveedor[['VENTA_PERDIDA_PESOS']].values
 
         ))
+        if df_tendencia is not None:
+            agregar_media_movil(fig, df_tendencia, proveedor, COLORES_SERIES[i % len(COLORES_SERIES)], 'Proveedor', i == 0)
 
     # Configurar el diseño de la gráfica
     fig.update_layout(
@@ -438,8 +345,6 @@ def graficar_venta_perdida_por_proveedor_y_semana(df_venta_perdida_filtrada, df_
 
     return fig
 
-# Uso de la función
-figura2 = graficar_venta_perdida_por_proveedor_y_semana(df_venta_perdida_filtrada, df_venta_filtrada)
 
 
 
@@ -481,12 +386,10 @@ def graficar_venta_perdida_por_subcategoria(df_venta_filtrada, df_venta_perdida_
 
     return fig
 
-# Uso de la función
-figura3 = graficar_venta_perdida_por_subcategoria(df_venta_filtrada, df_venta_perdida_filtrada)
 
 
 @st.cache_data
-def graficar_venta_perdida_por_mercado_lineas(df_venta_filtrada, df_venta_perdida_filtrada):
+def graficar_venta_perdida_por_mercado_lineas(df_venta_filtrada, df_venta_perdida_filtrada, df_tendencia=None):
     # Filtrar semanas comunes
     semanas_comunes = set(df_venta_filtrada['Semana Contable']).intersection(set(df_venta_perdida_filtrada['Semana Contable']))
     df_venta_filtrada_suma = df_venta_filtrada[df_venta_filtrada['Semana Contable'].isin(semanas_comunes)]
@@ -499,8 +402,8 @@ def graficar_venta_perdida_por_mercado_lineas(df_venta_filtrada, df_venta_perdid
     # Combinar los DataFrames para poder calcular el porcentaje
     df_combined = pd.merge(df_venta_perdida_suma, df_venta_suma, on=['Semana Contable', 'MERCADO'])
     df_combined['% Venta Perdida'] = (df_combined['VENTA_PERDIDA_PESOS'] / df_combined['Venta Neta Total']) * 100
-    # Redondear el porcentaje a un decimal y formatear como texto con el símbolo %
-    df_combined['% Venta Perdida'] = df_combined['% Venta Perdida'].round(1).astype(str) + '%'
+    # Redondear el porcentaje a un decimal; el símbolo % lo pone el texttemplate para que el eje siga siendo numérico
+    df_combined['% Venta Perdida'] = df_combined['% Venta Perdida'].round(1)
 
     # Filtrar solo los mercados más grandes para reducir el tamaño de los datos
     mercados_a_mostrar = df_combined.groupby('MERCADO')['VENTA_PERDIDA_PESOS'].sum().nlargest(5).index
@@ -517,15 +420,23 @@ def graficar_venta_perdida_por_mercado_lineas(df_venta_filtrada, df_venta_perdid
                   text='% Venta Perdida')  # Añadir el porcentaje de venta perdida como texto
 
     # Configurar el layout para que se muestre el % Venta Perdida en el texto sobre los puntos
-    fig.update_traces(textposition="top center")
+    fig.update_traces(
+        textposition="top center",
+        texttemplate='%{y:.1f}%',
+        hovertemplate='<b>Mercado:</b> %{fullData.name}<br><b>Semana:</b> %{x}<br><b>% Venta Perdida:</b> %{y:.1f}%<extra></extra>'
+    )
+
+    # Media móvil de cada mercado con el color que le asignó plotly express
+    if df_tendencia is not None:
+        colores = {trace.name: trace.line.color for trace in fig.data}
+        for i, mercado in enumerate(df_combined['MERCADO'].unique()):
+            agregar_media_movil(fig, df_tendencia, mercado, colores.get(str(mercado)), 'Mercado', i == 0)
 
     # Configurar el layout general
     fig.update_layout(title_font=dict(size=20),template="colors", xaxis=dict(title='Semana Contable'), yaxis=dict(title='% Venta Perdida'))
 
     return fig
 
-# Uso de la función
-figura4 = graficar_venta_perdida_por_mercado_lineas(df_venta_filtrada, df_venta_perdida_filtrada)
 
 
 
@@ -575,8 +486,6 @@ def graficar_venta_perdida_por_familia(df_venta_filtrada, df_venta_perdida_filtr
 
     return fig
 
-# Uso de la función
-figura5 = graficar_venta_perdida_por_familia(df_venta_filtrada, df_venta_perdida_filtrada)
 
 
 @st.cache_data
@@ -614,13 +523,11 @@ def graficar_venta_perdida_por_segmento(df_venta_filtrada, df_venta_perdida_filt
 
     return fig
 
-# Uso de la función
-figura6 = graficar_venta_perdida_por_segmento(df_venta_filtrada, df_venta_perdida_filtrada)
 
 
 
 @st.cache_data
-def graficar_venta_perdida_por_plaza(df_venta_perdida_filtrada, df_venta_filtrada):
+def graficar_venta_perdida_por_plaza(df_venta_perdida_filtrada, df_venta_filtrada, df_tendencia=None):
     # Sumar la venta perdida y venta neta total por plaza y semana
     df_venta_perdida_por_plaza = df_venta_perdida_filtrada.groupby(['Semana Contable', 'PLAZA']).agg({'VENTA_PERDIDA_PESOS': 'sum'}).reset_index()
     df_venta_neta_por_plaza = df_venta_filtrada.groupby(['Semana Contable', 'PLAZA']).agg({'Venta Neta Total': 'sum'}).reset_index()
@@ -633,10 +540,6 @@ def graficar_venta_perdida_por_plaza(df_venta_perdida_filtrada, df_venta_filtrad
 
     # Crear gráfico de líneas
     fig = go.Figure()
-    
-    colores = ['#00712D', '#FF9800', '#000080', '#FF6347', '#000000', 
-               '#FFD700', '#008080', '#FF7F50', '#006400', '#8B0000', 
-               '#FFCC66', '#33A85C', '#CD5C5C', '#FFA07A', '#2F4F4F'] 
 
     for i, plaza in enumerate(df_combined['PLAZA'].unique()):
         df_plaza = df_combined[df_combined['PLAZA'] == plaza]
@@ -647,7 +550,7 @@ def graficar_venta_perdida_por_plaza(df_venta_perdida_filtrada, df_venta_filtrad
             text=df_plaza['% Venta Perdida'].apply(lambda x: f'{x:.1f}%'),
             textposition='top right',
             name=plaza,
-            line=dict(color=colores[i % len(colores)]),  # ← Esto ya funciona bien
+            line=dict(color=COLORES_SERIES[i % len(COLORES_SERIES)]),  # ← Esto ya funciona bien
             hovertemplate=
                 '<b>Plaza:</b> ' + plaza + '<br>' +
                 '<b>Semana:</b> %{x}<br>'+
@@ -656,6 +559,9 @@ def graficar_venta_perdida_por_plaza(df_venta_perdida_filtrada, df_venta_filtrad
             customdata=df_plaza[['VENTA_PERDIDA_PESOS']].values
         ))
 
+        if df_tendencia is not None:
+            agregar_media_movil(fig, df_tendencia, plaza, COLORES_SERIES[i % len(COLORES_SERIES)], 'Plaza', i == 0)
+
 
     fig.update_layout(
         title='Venta Perdida semanal por Plaza 🌄',
@@ -673,12 +579,10 @@ def graficar_venta_perdida_por_plaza(df_venta_perdida_filtrada, df_venta_filtrad
 
     return fig
 
-# Uso de la función
-figura7 = graficar_venta_perdida_por_plaza(df_venta_perdida_filtrada, df_venta_filtrada)
 
 
 @st.cache_data
-def graficar_venta_perdida(df_venta_filtrada, df_venta_perdida_filtrada):
+def graficar_venta_perdida(df_venta_filtrada, df_venta_perdida_filtrada, df_tendencia=None):
     # Filtrar semanas comunes
     semanas_comunes = set(df_venta_filtrada['Semana Contable']).intersection(set(df_venta_perdida_filtrada['Semana Contable']))
     df_venta_filtrada_suma = df_venta_filtrada[df_venta_filtrada['Semana Contable'].isin(semanas_comunes)]
@@ -696,12 +600,13 @@ def graficar_venta_perdida(df_venta_filtrada, df_venta_perdida_filtrada):
     fig = go.Figure()
 
     # Agregar líneas de base con puntos
-    for division in df_combined['DIVISION'].unique():
+    for i, division in enumerate(df_combined['DIVISION'].unique()):
         df_div = df_combined[df_combined['DIVISION'] == division]
         fig.add_trace(go.Scatter(x=df_div['Semana Contable'], 
                                  y=df_div['% Venta Perdida'], 
                                  mode='lines+markers+text',
                                  name=division,
+                                 line=dict(color=COLORES_SERIES[i % len(COLORES_SERIES)]),
                                  text=df_div['% Venta Perdida'].apply(lambda x: f'{x:.1f}%'),
                                  textposition='top right',
                                  hovertemplate=
@@ -711,6 +616,8 @@ def graficar_venta_perdida(df_venta_filtrada, df_venta_perdida_filtrada):
                                     '<b>Venta Perdida $:</b> %{customdata[0]:,.0f}<extra></extra>',
                                  customdata=df_div[['VENTA_PERDIDA_PESOS']].values
                                          ))
+        if df_tendencia is not None:
+            agregar_media_movil(fig, df_tendencia, division, COLORES_SERIES[i % len(COLORES_SERIES)], 'División', i == 0)
 
     # Configurar el layout
     fig.update_layout(title="Venta Perdida semanal por División 🏴🏳️",
@@ -720,19 +627,9 @@ def graficar_venta_perdida(df_venta_filtrada, df_venta_perdida_filtrada):
 
     return fig
 
-# Uso de la función
-figura8 = graficar_venta_perdida(df_venta_filtrada, df_venta_perdida_filtrada)
 
 @st.cache_data
-def graficar_top_venta_perdida_en_dinero(df_venta_filtrada, df_venta_perdida_filtrada, MASTER):
-    # Convertir ARTICULO a string para garantizar la conexión con MASTER
-    df_venta_filtrada['ARTICULO'] = df_venta_filtrada['ARTICULO'].astype(str)
-    df_venta_perdida_filtrada['ARTICULO'] = df_venta_perdida_filtrada['ARTICULO'].astype(str)
-    MASTER['ARTICULO'] = MASTER['ARTICULO'].astype(str)
-
-    # Crear un diccionario de mapeo ARTICULO -> DESCRIPCIÓN
-    articulo_a_descripcion = MASTER.set_index('ARTICULO')['DESCRIPCIÓN'].to_dict()
-
+def graficar_top_venta_perdida_en_dinero(df_venta_filtrada, df_venta_perdida_filtrada, umbral=UMBRAL_PARETO, max_articulos=10):
     # Filtrar semanas comunes
     semanas_comunes = set(df_venta_filtrada['Semana Contable']).intersection(set(df_venta_perdida_filtrada['Semana Contable']))
     df_venta_perdida_filtrada_suma = df_venta_perdida_filtrada[df_venta_perdida_filtrada['Semana Contable'].isin(semanas_comunes)]
@@ -740,17 +637,12 @@ def graficar_top_venta_perdida_en_dinero(df_venta_filtrada, df_venta_perdida_fil
     # Sumar las ventas perdidas por artículo
     df_venta_perdida_suma = df_venta_perdida_filtrada_suma.groupby(['Semana Contable', 'ARTICULO'])['VENTA_PERDIDA_PESOS'].sum().reset_index()
 
-    # Calcular el total de venta perdida por artículo para determinar el Top 10
-    top_articulos = (
-        df_venta_perdida_suma.groupby('ARTICULO')['VENTA_PERDIDA_PESOS']
-        .sum()
-        .nlargest(10)
-        .index
-    )
-    df_top_venta_perdida = df_venta_perdida_suma[df_venta_perdida_suma['ARTICULO'].isin(top_articulos)]
+    # Artículos 80/20 (hasta el umbral de Venta Perdida acumulada), limitados a max_articulos para la gráfica
+    top_articulos = pareto(df_venta_perdida_suma, 'ARTICULO', umbral)['ARTICULO'].head(max_articulos)
+    df_top_venta_perdida = df_venta_perdida_suma[df_venta_perdida_suma['ARTICULO'].isin(top_articulos)].copy()
 
-    # Mapear ARTICULO a DESCRIPCIÓN
-    df_top_venta_perdida['DESCRIPCIÓN'] = df_top_venta_perdida['ARTICULO'].map(articulo_a_descripcion)
+    # DESCRIPCIÓN desde el índice de MASTER
+    df_top_venta_perdida['DESCRIPCIÓN'] = descripcion_articulo(df_top_venta_perdida['ARTICULO'])
 
     # Crear la gráfica apilada
     fig = px.bar(
@@ -761,7 +653,7 @@ def graficar_top_venta_perdida_en_dinero(df_venta_filtrada, df_venta_perdida_fil
         color_discrete_sequence = ['#007074', '#FFBF00', '#9694FF', '#222831', '#004225', '#1230AE', '#8D0B41', '#522258', 
          '#1F7D53', '#EB5B00', '#0D1282', '#09122C', '#ADFF2F', '#2F4F4F', "#7C00FE", "#D10363", "#16404D"],
         text='VENTA_PERDIDA_PESOS',
-        title='Top 10 Artículos con Mayor Venta Perdida (En Pesos)',
+        title=f'Top {len(top_articulos)} Artículos 80/20 con Mayor Venta Perdida (En Pesos)',
         labels={'VENTA_PERDIDA_PESOS': 'Venta Perdida en Pesos', 'DESCRIPCIÓN': 'Descripción del Artículo'},
         hover_data={'VENTA_PERDIDA_PESOS': ':,.2f'} )
     
@@ -784,134 +676,370 @@ def graficar_top_venta_perdida_en_dinero(df_venta_filtrada, df_venta_perdida_fil
 
     return fig
 
-# Uso de la función
-figura9 = graficar_top_venta_perdida_en_dinero(df_venta_filtrada, df_venta_perdida_filtrada, MASTER)
 
-#---------------------------------------------------------------------
-# Divisor y encabezado
-# Primera parte
-st.divider()
-st.subheader(':orange[Comparación de Venta perdida por Semana y Categoria]')
-c1, c6, c3 = st.columns([4, 3, 4])
-
-with c1:
-    st.plotly_chart(figura, use_container_width=True)
-with c6:
-    st.plotly_chart(figura6, use_container_width=True)
-with c3:
-    st.plotly_chart(figura3, use_container_width=True)
-# Segunda parte
-st.divider()
-st.subheader(':orange[Comparación por División y Plaza]')
-c4, c5 = st.columns([4, 4])
+@st.cache_data
+def graficar_pareto(df_pareto, nombre_dimension, umbral):
+    etiquetas = df_pareto['ETIQUETA'].astype(str)
 
-with c4:
-    st.plotly_chart(figura7, use_container_width=True)
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        x=etiquetas,
+        y=df_pareto['VENTA_PERDIDA_PESOS'],
+        name='Venta Perdida $',
+        hovertemplate='%{x}<br>$%{y:,.0f}<extra></extra>'
+    ))
+    fig.add_trace(go.Scatter(
+        x=etiquetas,
+        y=df_pareto['% acumulado'],
+        mode='lines+markers',
+        name='% acumulado',
+        yaxis='y2',
+        hovertemplate='%{x}<br>%{y:.1f}% acumulado<extra></extra>'
+    ))
 
-with c5:    
-    st.plotly_chart(figura8, use_container_width=True)
+    fig.update_layout(
+        title=f'Pareto de Venta Perdida por {nombre_dimension} ({umbral:.0%}) 📐',
+        title_font=dict(size=20),
+        yaxis=dict(title='Venta Perdida en Pesos'),
+        yaxis2=dict(title='% acumulado', overlaying='y', side='right', range=[0, 105]),
+        template="colors",
+        showlegend=False
+    )
+    fig.add_hline(y=umbral * 100, line_dash='dot', yref='y2')
 
-# Tercera parte
-st.divider()
-st.subheader(':orange[Comparación de Venta perdida por Mercado y División]')
-c6, c7, c8 = st.columns([4, 3, 4])
+    return fig
 
-with c6:
-    st.plotly_chart(figura4, use_container_width=True)
-with c7:
-    st.plotly_chart(figura5, use_container_width=True)
-with c8:
-    st.plotly_chart(figura2, use_container_width=True)
 
-# Cuarta parte
-st.divider()
-st.subheader(':orange[Artículos con mayor venta perdida]')
-c9 = st.columns([4])  # Si planeas añadir más columnas, ajusta los pesos.
-with c9[0]:  
-    st.plotly_chart(figura9, use_container_width=True)
-
-MASTER['ARTICULO'] = MASTER['ARTICULO'].astype(str)
-articulo_a_descripcion = MASTER.set_index('ARTICULO')['DESCRIPCIÓN'].to_dict()
-
-def Fig10(df_venta_perdida_filtrada, df_venta_filtrada, articulo_a_descripcion=None):
-    def pick(df, opciones):
-        return next((c for c in opciones if c in df.columns), None)
-
-    col_articulo = pick(df_venta_perdida_filtrada, ["ARTICULO","Artículo","ARTÍCULO"])
-    col_plaza    = pick(df_venta_perdida_filtrada, ["PLAZA","Plaza"])
-    col_mercado  = pick(df_venta_perdida_filtrada, ["MERCADO","Mercado"])
-    col_semana   = pick(df_venta_perdida_filtrada, ["Semana Contable","SEMANA_CONTABLE"])
-
-    df_combined = pd.merge(
-        df_venta_perdida_filtrada, 
-        df_venta_filtrada, 
-        on=[col_articulo,col_plaza,col_mercado,col_semana], 
-        how="inner"
-    )
+#---------------------------------------------------------------------
+# Caché de render: guarda el JSON ya serializado de cada figura por gráfica,
+# selección de filtros y versión de datos, y lo envía directo al navegador.
+# Así un rerun que no cambia una gráfica no vuelve a construirla ni a serializarla.
+
+# Comprimir el JSON guardado (menos memoria, un poco más de CPU al mostrar)
+COMPRIMIR_GRAFICAS = False
+
+# Selección actual de filtros (hashable) para la llave del caché; incluye el proveedor de la sesión
+seleccion_filtros = (proveedor_sesion, proveedor, division, tuple(sorted(plazas_acacia_seleccionadas)), mercado, semana, familia, categoria)
+
+@st.cache_resource(ttl=3600, max_entries=512, show_spinner=False)
+def figura_serializada(id_grafica, seleccion_filtros, version_datos, comprimir, _construir):
+    # Solo se ejecuta si no hay JSON guardado para esta llave; _construir no forma parte de la llave
+    spec = pio.to_json(_construir(), validate=False)
+    if comprimir:
+        return zlib.compress(spec.encode('utf-8'))
+    return spec
+
+def mostrar_grafica(contenedor, id_grafica, construir, use_container_width=True):
+    spec = figura_serializada(id_grafica, seleccion_filtros, version_datos, COMPRIMIR_GRAFICAS, construir)
+    if isinstance(spec, bytes):
+        spec = zlib.decompress(spec).decode('utf-8')
+
+    # Mismo mensaje que arma st.plotly_chart (streamlit 1.38), pero sin reconstruir ni re-serializar la figura
+    if PlotlyChartProto is not None and hasattr(contenedor, '_enqueue'):
+        try:
+            plotly_chart_proto = PlotlyChartProto()
+            plotly_chart_proto.use_container_width = use_container_width
+            plotly_chart_proto.theme = 'streamlit'
+            plotly_chart_proto.spec = spec
+            plotly_chart_proto.config = json.dumps({'showLink': False, 'linkText': False})
+            plotly_chart_proto.id = compute_widget_id(
+                'plotly_chart',
+                id_grafica=id_grafica,
+                seleccion_filtros=str(seleccion_filtros),
+                version_datos=version_datos,
+                use_container_width=use_container_width,
+            )
+        except (AttributeError, TypeError, ValueError):
+            # El proto cambió en otra versión de Streamlit
+            plotly_chart_proto = None
+        if plotly_chart_proto is not None:
+            return contenedor._enqueue('plotly_chart', plotly_chart_proto)
+
+    # Sin los internos: la vía pública, reconstruyendo la figura desde el JSON guardado
+    return contenedor.plotly_chart(pio.from_json(spec, skip_invalid=True), use_container_width=use_container_width, key=f'grafica_{id_grafica}')
 
-    df_combined['% Venta Perdida'] = (
-        df_combined['VENTA_PERDIDA_PESOS'] / 
-        df_combined['Venta Neta Total'].replace(0, np.nan)
-    ) * 100
-
-    # Últimas 3 semanas
-    ult_3_sem = sorted(df_combined[col_semana].unique(), reverse=True)[:3]
-    df_3sem = df_combined[df_combined[col_semana].isin(ult_3_sem)]
-
-    # 1️⃣ Artículo → en %
-    art_kpi = (
-        df_3sem.groupby(col_articulo)[["Venta Neta Total","VENTA_PERDIDA_PESOS"]]
-        .sum()
-        .assign(pct=lambda d: (d["VENTA_PERDIDA_PESOS"]/d["Venta Neta Total"].replace(0,np.nan))*100)
-        .sort_values(["Venta Neta Total","VENTA_PERDIDA_PESOS"], ascending=False)
-        .head(1)
-    )
-    art_code = art_kpi.index[0]
-    art_desc = articulo_a_descripcion.get(str(art_code), str(art_code)) if articulo_a_descripcion else str(art_code)
-    art_pct  = art_kpi["pct"].iloc[0]
-
-    # 2️⃣ Plaza → en pesos $
-    ultima_sem = max(df_combined[col_semana])
-    plaza_grp = (
-        df_combined[df_combined[col_semana]==ultima_sem]
-        .groupby(col_plaza)["VENTA_PERDIDA_PESOS"]
-        .sum()
-    )
-    plaza_kpi = plaza_grp.idxmax()
-    plaza_vp  = plaza_grp.max()
+#---------------------------------------------------------------------
+# Tendencias del motor: el estado de cada dimensión y filtros se comparte entre sesiones
+# y se actualiza de forma incremental cuando cambia la versión de los datos.
+@st.cache_resource(max_entries=64, show_spinner=False)
+def estado_tendencia(dimension, seleccion_filtros):
+    # Estado mutable por dimensión y filtros, compartido entre sesiones
+    return estado_tendencia_vacio()
+
+def tendencias(dimension):
+    estado = estado_tendencia(dimension, seleccion_filtros)
+    return tendencias_al_dia(estado, version_datos, df_venta_perdida_filtrada, df_venta_filtrada, dimension)
+
+def alertas_tendencia():
+    tendencias_por_dimension = {nombre: tendencias(dimension) for nombre, dimension in DIMENSIONES_TENDENCIA.items()}
+    return motor.alertas_tendencia(tendencias_por_dimension, indice_master)
+
+def mostrar_kpis():
+    kpis = calcular_kpis(df_venta_perdida_filtrada, df_venta_filtrada, indice_master)
+    if kpis is None:
+        kpi_top.info('No hay datos de Venta Perdida y Venta en común para los filtros elegidos.')
+        return
+
+    with kpi_top:
+        c7, c8, c9 = st.columns([4,3,4])
+
+        # Artículo en %
+        with c7:
+            nombre, pct = kpis["Articulo"]
+            st.metric("🚨 Artículo 80/20 con alta VP (Últimas 3 semanas)", f"{pct:.2f}%", delta=nombre)
+
+        # Plaza en $
+        with c8:
+            nombre, vp = kpis["Plaza"]
+            st.metric("🏬 Plaza con mayor VP (Última semana)", f"${vp:,.0f}", delta=nombre)
+
+        # Mercado en $
+        with c9:
+            nombre, vp = kpis["Mercado"]
+            st.metric("🛒 Mercado con mayor VP (Últimas 3 semanas)", f"${vp:,.0f}", delta=nombre)
 
-    # 3️⃣ Mercado → en pesos $
-    mercado_grp = (
-        df_3sem.groupby(col_mercado)["VENTA_PERDIDA_PESOS"]
-        .sum()
-    )
-    mercado_kpi = mercado_grp.idxmax()
-    mercado_vp  = mercado_grp.max()
+#---------------------------------------------------------------------
+# Secciones del tablero: cada una es un fragmento que solo calcula sus gráficas
+# cuando está visible. Mostrar u ocultar una sección vuelve a ejecutar solo ese
+# fragmento, y sus gráficas salen del caché de render mientras no cambien sus filtros.
+
+def encabezado_seccion(titulo, clave, visible_por_defecto):
+    st.divider()
+    st.subheader(titulo)
+    return st.toggle('Mostrar gráficas', value=visible_por_defecto, key=f'ver_{clave}')
+
+def reservar_huecos(*columnas):
+    # Un placeholder por gráfica; mostrar_grafica lo reemplaza cuando la figura está lista
+    huecos = []
+    for columna in columnas:
+        hueco = columna.empty()
+        hueco.caption('⏳ Cargando gráfica...')
+        huecos.append(hueco)
+    return huecos
 
-    return {
-        "Articulo": (art_desc, art_pct),
-        "Plaza": (plaza_kpi, plaza_vp),
-        "Mercado": (mercado_kpi, mercado_vp)
-    }
+# Primera parte
+@st.fragment
+def seccion_semana_categoria():
+    if not encabezado_seccion(':orange[Comparación de Venta perdida por Semana y Categoria]', 'semana_categoria', True):
+        return
+    c1, c6, c3 = reservar_huecos(*st.columns([4, 3, 4]))
+    mostrar_grafica(c1, 'porcentaje_semana', lambda: graficar_porcentaje_venta_perdida_por_semana(df_venta_filtrada, df_venta_perdida_filtrada, tendencias(None)))
+    mostrar_grafica(c6, 'segmento', lambda: graficar_venta_perdida_por_segmento(df_venta_filtrada, df_venta_perdida_filtrada))
+    mostrar_grafica(c3, 'subcategoria', lambda: graficar_venta_perdida_por_subcategoria(df_venta_filtrada, df_venta_perdida_filtrada))
 
-kpis = Fig10(df_venta_perdida_filtrada, df_venta_filtrada, articulo_a_descripcion)
+# Segunda parte
+@st.fragment
+def seccion_division_plaza():
+    if not encabezado_seccion(':orange[Comparación por División y Plaza]', 'division_plaza', False):
+        return
+    c4, c5 = reservar_huecos(*st.columns([4, 4]))
+    mostrar_grafica(c4, 'plaza', lambda: graficar_venta_perdida_por_plaza(df_venta_perdida_filtrada, df_venta_filtrada, tendencias('PLAZA')))
+    mostrar_grafica(c5, 'division', lambda: graficar_venta_perdida(df_venta_filtrada, df_venta_perdida_filtrada, tendencias('DIVISION')))
 
-with kpi_top:
-    c7, c8, c9 = st.columns([4,3,4])
+# Tercera parte
+@st.fragment
+def seccion_mercado_division():
+    if not encabezado_seccion(':orange[Comparación de Venta perdida por Mercado y División]', 'mercado_division', False):
+        return
+    c6, c7, c8 = reservar_huecos(*st.columns([4, 3, 4]))
+    mostrar_grafica(c6, 'mercado', lambda: graficar_venta_perdida_por_mercado_lineas(df_venta_filtrada, df_venta_perdida_filtrada, tendencias('MERCADO')))
+    mostrar_grafica(c7, 'familia', lambda: graficar_venta_perdida_por_familia(df_venta_filtrada, df_venta_perdida_filtrada))
+    mostrar_grafica(c8, 'proveedor', lambda: graficar_venta_perdida_por_proveedor_y_semana(
+        df_venta_perdida_filtrada, df_venta_filtrada, media_movil_sobre_total(tendencias('PROVEEDOR'), tendencias(None))))
 
-    # Artículo en %
-    with c7:
-        nombre, pct = kpis["Articulo"]
-        st.metric("🚨 Artículo 80/20 con alta VP (Últimas 3 semanas)", f"{pct:.2f}%", delta=nombre)
+# Cuarta parte
+@st.fragment
+def seccion_articulos():
+    if not encabezado_seccion(':orange[Artículos con mayor venta perdida]', 'articulos', False):
+        return
+    c9 = reservar_huecos(*st.columns([4]))  # Si planeas añadir más columnas, ajusta los pesos.
+    mostrar_grafica(c9[0], 'top_articulos', lambda: graficar_top_venta_perdida_en_dinero(df_venta_filtrada, df_venta_perdida_filtrada))
+
+#---------------------------------------------------------------------
+# Exportación por bloques: el archivo se arma desde un generador que recorre la
+# selección filtrada en pedazos, sin construir antes todo el archivo en memoria.
+# - Con VENTA_PERDIDA_API el navegador descarga de api_venta_perdida.py, que envía el archivo
+#   por bloques mientras lo genera. Es una URL que abre el navegador del usuario, no el servidor:
+#   la API debe estar publicada junto al tablero (ver el encabezado de api_venta_perdida.py).
+# - Sin API, cada bloque se escribe en disco en static/exportaciones/ y el propio servidor de
+#   Streamlit entrega el archivo desde disco en /app/static/ (server.enableStaticServing en
+#   .streamlit/config.toml). Cada exportación va en una carpeta con nombre aleatorio y se
+#   borra después de EDAD_MAXIMA_EXPORTACION segundos.
+API_VENTA_PERDIDA = os.getenv('VENTA_PERDIDA_API')
+DIRECTORIO_EXPORTACIONES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'exportaciones')
+EDAD_MAXIMA_EXPORTACION = 3600
+# Tamaño máximo que Streamlit sirve desde static/
+MAX_BYTES_ESTATICO = 200 * 1024 * 1024
+
+def url_exportacion(conjunto, formato):
+    parametros = [('conjunto', conjunto), ('formato', formato)]
+    for campo in ['proveedor', 'division', 'mercado', 'semana', 'familia', 'categoria']:
+        valor = getattr(consulta, campo) or (proveedor_sesion if campo == 'proveedor' else None)
+        if valor:
+            parametros.append((campo, valor))
+    parametros += [('plaza', plaza) for plaza in consulta.plazas]
+    return f"{API_VENTA_PERDIDA.rstrip('/')}/exportar?{urlencode(parametros)}"
+
+def limpiar_exportaciones():
+    # Borra las exportaciones viejas; las recientes pueden estar descargándose
+    if not os.path.isdir(DIRECTORIO_EXPORTACIONES):
+        return
+    for nombre in os.listdir(DIRECTORIO_EXPORTACIONES):
+        ruta = os.path.join(DIRECTORIO_EXPORTACIONES, nombre)
+        try:
+            vieja = time.time() - os.path.getmtime(ruta) > EDAD_MAXIMA_EXPORTACION
+        except OSError:
+            continue
+        if vieja:
+            shutil.rmtree(ruta, ignore_errors=True)
+
+def exportar_a_disco(df, formato, nombre_archivo):
+    # Ruta relativa (para el enlace) del archivo escrito por bloques, o None si excede lo que sirve Streamlit
+    limpiar_exportaciones()
+    carpeta = uuid.uuid4().hex
+    os.makedirs(os.path.join(DIRECTORIO_EXPORTACIONES, carpeta))
+    ruta = os.path.join(DIRECTORIO_EXPORTACIONES, carpeta, nombre_archivo)
+    if guardar_exportacion(generadores_exportacion[formato](df), ruta) > MAX_BYTES_ESTATICO:
+        shutil.rmtree(os.path.dirname(ruta), ignore_errors=True)
+        return None
+    return f'app/static/exportaciones/{carpeta}/{nombre_archivo}'
+
+# Quinta parte
+@st.fragment
+def seccion_pareto():
+    if not encabezado_seccion(':orange[Análisis 80/20 de Venta Perdida]', 'pareto', False):
+        return
+    c13, c14 = st.columns([3, 4])
+    with c13:
+        nombre_dimension = st.selectbox('Dimensión', list(DIMENSIONES_PARETO), key='pareto_dimension')
+        umbral = st.slider('Umbral de Venta Perdida acumulada', 0.50, 0.95, UMBRAL_PARETO, 0.05, format='%.2f', key='pareto_umbral')
+    dimension = DIMENSIONES_PARETO[nombre_dimension]
+    df_pareto = pareto(df_venta_perdida_filtrada, dimension, umbral)
+    if dimension == 'ARTICULO':
+        etiquetas = descripcion_articulo(df_pareto[dimension])
+    else:
+        etiquetas = df_pareto[dimension].astype(str)
+    df_pareto.insert(2, 'ETIQUETA', etiquetas)
+    with c13:
+        st.caption(f'{len(df_pareto)} de {df_venta_perdida_filtrada[dimension].nunique()} concentran el {umbral:.0%} de la Venta Perdida.')
+        st.dataframe(
+            df_pareto if dimension == 'ARTICULO' else df_pareto.drop(columns=['ETIQUETA']),
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                'ETIQUETA': 'Descripción',
+                'ARTICULO': st.column_config.NumberColumn('Artículo', format='%d'),
+                'VENTA_PERDIDA_PESOS': st.column_config.NumberColumn('Venta Perdida $', format='$%.0f'),
+                '% del total': st.column_config.NumberColumn(format='%.2f%%'),
+                '% acumulado': st.column_config.NumberColumn(format='%.2f%%'),
+            },
+        )
+    mostrar_grafica(c14, f'pareto_{dimension}_{umbral:.2f}', lambda: graficar_pareto(df_pareto, nombre_dimension, umbral))
+
+# Sexta parte
+@st.fragment
+def seccion_alertas():
+    if not encabezado_seccion(':orange[Alertas de tendencia 📈]', 'alertas', False):
+        return
+    st.caption(f'Series cuya última semana sube contra la anterior con z-score ≥ {UMBRAL_ZSCORE:g} '
+               f'frente a sus {VENTANA_ZSCORE} semanas previas.')
+    st.dataframe(
+        alertas_tendencia(),
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            'VENTA_PERDIDA_PESOS': st.column_config.NumberColumn('Venta Perdida $', format='$%.0f'),
+            'Venta Neta Total': st.column_config.NumberColumn(format='$%.0f'),
+            '% Venta Perdida': st.column_config.NumberColumn(format='%.2f%%'),
+            'Media móvil 4 sem': st.column_config.NumberColumn(format='%.2f%%'),
+            'Δ semanal': st.column_config.NumberColumn(format='%+.2f pp'),
+            'z-score': st.column_config.NumberColumn(format='%.2f'),
+        },
+    )
 
-    # Plaza en $
-    with c8:
-        nombre, vp = kpis["Plaza"]
-        st.metric("🏬 Plaza con mayor VP (Última semana)", f"${vp:,.0f}", delta=nombre)
+# Séptima parte
+@st.fragment
+def seccion_riesgo():
+    if not encabezado_seccion(':orange[En riesgo de desabasto ⚠️]', 'riesgo', False):
+        return
+    st.caption(f'Tiendas × artículos del último corte con más Venta Perdida esperada en los próximos {HORIZONTE_RIESGO} días: '
+               f'pesos que el inventario no cubre, ponderados por la falta de cobertura y por los días en desabasto '
+               f'de los últimos {VENTANA_RECURRENCIA}.')
+    st.dataframe(
+        riesgo_desabasto(df_venta_perdida_filtrada, indice_master),
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            'NUM_TIENDA': st.column_config.NumberColumn('Tienda', format='%d'),
+            'NOMBRE_TIENDA': 'Nombre tienda',
+            'ARTICULO': st.column_config.NumberColumn(format='%d'),
+            'INVENTARIO_UDS': st.column_config.NumberColumn('Inventario uds', format='%.0f'),
+            'VENTA_UDS_PTD': st.column_config.NumberColumn('Venta diaria uds', format='%.2f'),
+            'Días de cobertura': st.column_config.NumberColumn(format='%.1f'),
+            'Riesgo': st.column_config.ProgressColumn(min_value=0, max_value=1, format='%.2f'),
+            'VP esperada próxima semana': st.column_config.NumberColumn(format='$%.0f'),
+        },
+    )
 
-    # Mercado en $
-    with c9:
-        nombre, vp = kpis["Mercado"]
-        st.metric("🛒 Mercado con mayor VP (Últimas 3 semanas)", f"${vp:,.0f}", delta=nombre)
+# Octava parte
+@st.fragment
+def seccion_exportar():
+    if not encabezado_seccion(':orange[Exportar datos filtrados 📥]', 'exportar', False):
+        return
+    c10, c11, c12 = st.columns([4, 3, 4])
+    with c10:
+        conjunto = st.selectbox('Datos', list(CONJUNTOS_EXPORTACION), key='exportar_conjunto')
+    with c11:
+        formato = st.radio('Formato', list(FORMATOS_EXPORTACION), horizontal=True, key='exportar_formato')
+    with c12:
+        extension, _ = FORMATOS_EXPORTACION[formato]
+        nombre_archivo = CONJUNTOS_EXPORTACION[conjunto]
+        df = datos_exportacion(nombre_archivo, df_venta_perdida_filtrada, df_venta_filtrada, indice_master)
+        try:
+            validar_exportacion(df, formato)
+        except ValueError as e:
+            st.warning(str(e))
+            return
+        archivo = f'venta_perdida_{nombre_archivo}.{extension}'
+        if API_VENTA_PERDIDA:
+            st.link_button(f'Descargar {extension.upper()}', url_exportacion(nombre_archivo, formato))
+        elif not st.get_option('server.enableStaticServing'):
+            st.warning('Para exportar sin la API active server.enableStaticServing en .streamlit/config.toml.')
+        # Solo se genera el archivo cuando se pide, no en cada rerun
+        elif st.button('Preparar archivo', key='exportar_preparar'):
+            with st.spinner('Generando archivo...'):
+                enlace = exportar_a_disco(df, formato, archivo)
+            if enlace is None:
+                st.warning(f'El archivo pasa de {MAX_BYTES_ESTATICO // 2**20} MB; filtre más o use Parquet.')
+            else:
+                # `download` guarda el archivo con su nombre (Streamlit lo sirve como texto plano)
+                st.markdown(f'<a href="{enlace}" download="{archivo}">⬇️ Descargar {extension.upper()}</a>', unsafe_allow_html=True)
 
- 
+#---------------------------------------------------------------------
+# Render progresivo: primero los KPI (agregados baratos), luego las secciones en
+# orden de prioridad, cada una en el lugar que le toca dentro del tablero.
+RENDER_PROGRESIVO = True
+
+secciones = {
+    'semana_categoria': seccion_semana_categoria,
+    'division_plaza': seccion_division_plaza,
+    'mercado_division': seccion_mercado_division,
+    'articulos': seccion_articulos,
+    'pareto': seccion_pareto,
+    'alertas': seccion_alertas,
+    'riesgo': seccion_riesgo,
+    'exportar': seccion_exportar,
+}
+PRIORIDAD_SECCIONES = ['semana_categoria', 'articulos', 'division_plaza', 'mercado_division', 'pareto', 'alertas', 'riesgo', 'exportar']
+
+if RENDER_PROGRESIVO:
+    mostrar_kpis()
+    # Reservar el lugar de cada sección en el orden del tablero y llenarlas por prioridad
+    lugares = {clave: st.container() for clave in secciones}
+    for clave in PRIORIDAD_SECCIONES:
+        with lugares[clave]:
+            secciones[clave]()
+else:
+    for seccion in secciones.values():
+        seccion()
+    mostrar_kpis()
@@ -0,0 +1,218 @@
+# API JSON local sobre el motor de Venta Perdida, para consultas sin abrir el tablero.
+# Uso: python folder/api_venta_perdida.py --puerto 8502
+#   GET /salud
+#   GET /opciones?proveedor=PMI
+#   GET /kpis?proveedor=PMI&plaza=Jalisco&plaza=Puebla
+#   GET /agregado?por=Semana Contable&por=PLAZA
+#   GET /pareto?dimension=ARTICULO&umbral=0.8
+#   GET /tendencias?dimension=PLAZA
+#   GET /alertas
+#   GET /riesgo?max=50
+#   GET /exportar?conjunto=detalle_venta_perdida&formato=CSV   (archivo por bloques, no JSON)
+# Los filtros (proveedor, division, plaza, mercado, semana, familia, categoria) valen en todas las rutas.
+#
+# El tablero (VentaPerdida.py) usa /exportar cuando VENTA_PERDIDA_API tiene la URL de esta API, y
+# esa URL la abre el navegador del usuario, no el servidor. Por omisión la API escucha solo en
+# 127.0.0.1, así que para usuarios remotos hay que publicarla en una ruta que su navegador alcance:
+#   - detrás del mismo proxy que el tablero, p. ej. en nginx
+#       location /api/ { proxy_pass http://127.0.0.1:8502/; proxy_buffering off; }
+#     con VENTA_PERDIDA_API=https://<host del tablero>/api, o
+#   - directamente con --host 0.0.0.0 y VENTA_PERDIDA_API=http://<host>:8502.
+# proxy_buffering off deja pasar los bloques de /exportar conforme se generan.
+import argparse
+import json
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from motor_venta_perdida import (
+    Consulta, MotorVentaPerdida, UMBRAL_PARETO, DIMENSIONES_PARETO, DIMENSIONES_TENDENCIA, MAX_ARTICULOS_RIESGO,
+)
+
+# Columnas por las que se puede agregar
+COLUMNAS_AGREGADO = {'Semana Contable', 'PROVEEDOR', 'DIVISION', 'PLAZA', 'MERCADO', 'FAMILIA', 'SEGMENTO', 'SUBCATEGORIA', 'ARTICULO'}
+
+class ErrorConsulta(Exception):
+    pass
+
+def consulta_desde_parametros(parametros):
+    def uno(nombre):
+        valores = parametros.get(nombre)
+        return valores[-1] if valores else None
+    return Consulta(
+        proveedor=uno('proveedor'),
+        division=uno('division'),
+        plazas=tuple(sorted(parametros.get('plaza', []))),
+        mercado=uno('mercado'),
+        semana=uno('semana'),
+        familia=uno('familia'),
+        categoria=uno('categoria'),
+    )
+
+def registros(df):
+    # DataFrame -> lista de registros JSON (NaN como null)
+    return json.loads(df.to_json(orient='records', force_ascii=False))
+
+def ruta_salud(motor, consulta, parametros):
+    return {'estado': 'ok', 'version': motor.cargar()}
+
+def ruta_opciones(motor, consulta, parametros):
+    return motor.opciones(consulta)
+
+def ruta_kpis(motor, consulta, parametros):
+    return motor.kpis(consulta)
+
+def ruta_agregado(motor, consulta, parametros):
+    por = parametros.get('por', ['Semana Contable'])
+    invalidas = [columna for columna in por if columna not in COLUMNAS_AGREGADO]
+    if invalidas:
+        raise ErrorConsulta(f'No se puede agregar por: {", ".join(invalidas)}')
+    return registros(motor.agregado(consulta, por))
+
+def ruta_pareto(motor, consulta, parametros):
+    dimension = parametros.get('dimension', ['ARTICULO'])[-1]
+    if dimension not in DIMENSIONES_PARETO.values():
+        raise ErrorConsulta(f'Dimensión no válida: {dimension}')
+    try:
+        umbral = float(parametros.get('umbral', [UMBRAL_PARETO])[-1])
+    except ValueError:
+        umbral = None
+    if umbral is None or not 0 < umbral <= 1:
+        raise ErrorConsulta('El umbral debe ser un número entre 0 y 1')
+    return registros(motor.pareto(consulta, dimension, umbral))
+
+def ruta_tendencias(motor, consulta, parametros):
+    # Acepta el nombre visible (Plaza) o la columna (PLAZA)
+    dimension = parametros.get('dimension', ['Total'])[-1]
+    columnas = {columna: nombre for nombre, columna in DIMENSIONES_TENDENCIA.items() if columna}
+    nombre = dimension if dimension in DIMENSIONES_TENDENCIA else columnas.get(dimension)
+    if nombre is None:
+        raise ErrorConsulta(f'Dimensión no válida: {dimension}')
+    return registros(motor.tendencias(consulta, DIMENSIONES_TENDENCIA[nombre]))
+
+def ruta_alertas(motor, consulta, parametros):
+    return registros(motor.alertas(consulta))
+
+def ruta_riesgo(motor, consulta, parametros):
+    try:
+        max_articulos = int(parametros.get('max', [MAX_ARTICULOS_RIESGO])[-1])
+    except ValueError:
+        max_articulos = 0
+    if max_articulos < 1:
+        raise ErrorConsulta('max debe ser un entero positivo')
+    return registros(motor.riesgo(consulta, max_articulos))
+
+RUTAS = {
+    '/salud': ruta_salud,
+    '/opciones': ruta_opciones,
+    '/kpis': ruta_kpis,
+    '/agregado': ruta_agregado,
+    '/pareto': ruta_pareto,
+    '/tendencias': ruta_tendencias,
+    '/alertas': ruta_alertas,
+    '/riesgo': ruta_riesgo,
+}
+
+class ServidorVentaPerdida(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, direccion, motor, max_respuestas=256):
+        super().__init__(direccion, ManejadorVentaPerdida)
+        self.motor = motor
+        self.max_respuestas = max_respuestas
+        # Respuestas ya serializadas por (versión, ruta, parámetros)
+        self.respuestas = OrderedDict()
+        self.candado = threading.Lock()
+
+    def respuesta(self, ruta, parametros):
+        version = self.motor.cargar()
+        llave = (version, ruta, tuple(sorted((nombre, tuple(valores)) for nombre, valores in parametros.items())))
+        with self.candado:
+            if llave in self.respuestas:
+                self.respuestas.move_to_end(llave)
+                return self.respuestas[llave]
+        resultado = RUTAS[ruta](self.motor, consulta_desde_parametros(parametros), parametros)
+        cuerpo = json.dumps(resultado, ensure_ascii=False, default=str).encode('utf-8')
+        with self.candado:
+            self.respuestas[llave] = cuerpo
+            while len(self.respuestas) > self.max_respuestas:
+                self.respuestas.popitem(last=False)
+        return cuerpo
+
+class ManejadorVentaPerdida(BaseHTTPRequestHandler):
+    # HTTP/1.1 para poder enviar las exportaciones con Transfer-Encoding: chunked
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        parametros = parse_qs(url.query)
+        ruta = url.path.rstrip('/') or '/'
+        if ruta == '/exportar':
+            return self.exportar(parametros)
+        try:
+            if ruta not in RUTAS:
+                cuerpo, estado = self.error(f'Ruta no encontrada: {url.path}'), 404
+            else:
+                cuerpo, estado = self.server.respuesta(ruta, parametros), 200
+        except ErrorConsulta as e:
+            cuerpo, estado = self.error(str(e)), 400
+        except Exception as e:
+            cuerpo, estado = self.error(f'Error al calcular la respuesta: {e}'), 500
+        self.enviar(estado, cuerpo)
+
+    def exportar(self, parametros):
+        conjunto = parametros.get('conjunto', ['detalle_venta_perdida'])[-1]
+        formato = parametros.get('formato', ['CSV'])[-1]
+        try:
+            nombre, mime, partes = self.server.motor.exportar(consulta_desde_parametros(parametros), conjunto, formato)
+        except ValueError as e:
+            return self.enviar(400, self.error(str(e)))
+        except Exception as e:
+            return self.enviar(500, self.error(f'Error al preparar la exportación: {e}'))
+
+        # Cada parte se envía en cuanto se genera; nada del archivo se guarda en el servidor
+        self.send_response(200)
+        self.send_header('Content-Type', mime)
+        self.send_header('Content-Disposition', f'attachment; filename="{nombre}"')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            for parte in partes:
+                if parte:
+                    self.wfile.write(f'{len(parte):X}\r\n'.encode('ascii') + parte + b'\r\n')
+            self.wfile.write(b'0\r\n\r\n')
+        except Exception:
+            # La respuesta ya empezó: se corta la conexión para que el cliente no reciba un archivo a medias como completo
+            self.close_connection = True
+
+    def enviar(self, estado, cuerpo):
+        self.send_response(estado)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def error(self, mensaje):
+        return json.dumps({'error': mensaje}, ensure_ascii=False).encode('utf-8')
+
+def main():
+    parser = argparse.ArgumentParser(description='API JSON local de Venta Perdida')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=8502)
+    parser.add_argument('--refresco', type=int, default=3600, help='Segundos entre revisiones de datos nuevos en GitHub')
+    args = parser.parse_args()
+
+    motor = MotorVentaPerdida(refresco_segundos=args.refresco)
+    motor.cargar()  # Datos calientes desde el arranque
+    servidor = ServidorVentaPerdida((args.host, args.puerto), motor)
+    print(f'API de Venta Perdida en http://{args.host}:{args.puerto}')
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+if __name__ == '__main__':
+    main()
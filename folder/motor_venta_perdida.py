@@ -0,0 +1,1056 @@
+# Motor de Venta Perdida sin Streamlit: carga y prepara los datos, aplica los filtros y
+# calcula agregados, KPIs, Pareto y tendencias. Lo usan el tablero (VentaPerdida.py)
+# y la API JSON local (api_venta_perdida.py).
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from io import BytesIO, RawIOBase
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import requests
+from openpyxl import Workbook
+
+# URLs de las carpetas en GitHub usando la API (sin raw aún)
+csv_folder_url = 'https://api.github.com/repos/Edwinale20/Sdkiap/contents/Venta%20Perdida'
+venta_semanal_folder_url = 'https://api.github.com/repos/Edwinale20/Sdkiap/contents/Venta%20semanal'
+master_github_url = 'https://raw.githubusercontent.com/Edwinale20/Sdkiap/main/MASTER.xlsx'
+
+# Función para obtener la lista de archivos en una carpeta de GitHub con URL raw
+def list_files_in_github_folder(folder_url):
+    response = requests.get(folder_url)
+    response.raise_for_status()  # Verifica si la solicitud fue exitosa
+    files_info = response.json()
+
+    # Obtener las raw URLs
+    raw_urls = [file_info['download_url'] for file_info in files_info if file_info['type'] == 'file']
+    return raw_urls
+
+# Función para descargar y leer archivos CSV y Excel desde GitHub (raw URLs)
+def download_file_from_github(url):
+    response = requests.get(url)
+    response.raise_for_status()  # Verifica si la solicitud fue exitosa
+    return BytesIO(response.content)
+
+# Versión de los datos: cambia cuando cambia la lista de archivos publicados en GitHub
+def version_de_datos(csv_files, venta_semanal):
+    return hashlib.md5('|'.join(csv_files + venta_semanal + [master_github_url]).encode('utf-8')).hexdigest()
+
+#---------------------------------------------------------------------
+# ARTICULO es una llave int64 validada de punta a punta; el texto solo se usa para mostrar
+def llave_articulo(serie):
+    # Enteros pasan directo; flotantes solo si son enteros exactos; el texto se convierte sin
+    # pasar por float para no corromper IDs grandes. Lo inválido queda como <NA>.
+    if pd.api.types.is_integer_dtype(serie):
+        return serie.astype('Int64')
+    if pd.api.types.is_float_dtype(serie):
+        exactos = np.isfinite(serie) & (serie == np.floor(serie)) & (serie.abs() < 2**53)
+        return serie.where(exactos).astype('Int64')
+    texto = serie.astype('string').str.strip().str.replace(r'\.0*$', '', regex=True)
+    validos = texto.str.fullmatch(r'-?\d+').fillna(False)
+    # Rango de int64 comparando los dígitos como texto (mismo largo => orden lexicográfico)
+    digitos = texto.str.lstrip('-').str.lstrip('0')
+    limite = pd.Series(np.where(texto.str.startswith('-').fillna(False), str(2**63), str(2**63 - 1)), index=texto.index)
+    en_rango = (digitos.str.len() < 19) | ((digitos.str.len() == 19) & (digitos <= limite))
+    return texto.where(validos & en_rango.fillna(False)).astype('Int64')
+
+# Semana Contable como texto ordenable: YYYY-Sem WW (ej: 2025-Sem 52, 2026-Sem 01)
+def semana_legible(serie):
+    wk = pd.to_numeric(serie, errors='coerce').astype('Int64')
+    s  = wk.astype(str).str.zfill(6)
+    return s.str[:4] + "-Sem " + s.str[-2:]
+
+#---------------------------------------------------------------------
+def venta_perdida(csv_files):
+    combined_df = pd.DataFrame()  # Crear un DataFrame vacío para almacenar todos los datos
+
+    # Loop through each CSV file and append its contents to the combined dataframe
+    for csv_file in csv_files:
+        df = pd.read_csv(csv_file, encoding='ISO-8859-1')
+
+        # Extraer el nombre del archivo sin la ruta completa y sin la extensión .csv
+        file_name = os.path.splitext(os.path.basename(csv_file))[0]
+        df['Día'] = file_name
+
+        # Asumir que el nombre del archivo es la fecha en formato 'ddmmyyyy'
+        df['Fecha'] = pd.to_datetime(file_name, format='%d%m%Y', errors='coerce')
+
+        # Calcular la semana contable
+        iso = df['Fecha'].dt.isocalendar()
+        df['Semana Contable'] = iso['year'].astype(str) + iso['week'].astype(str).astype(str).str.zfill(2)
+
+        # Concatenar el DataFrame actual al DataFrame combinado
+        combined_df = pd.concat([combined_df, df])
+
+    # Eliminar las columnas no deseadas (inventario, tienda y fecha se quedan para el riesgo de desabasto)
+    combined_df = combined_df.drop(columns=['UPC','CAMPO', 'PROVEEDOR', 'CATEGORIA'])
+    combined_df['DIVISION'] = combined_df['DIVISION'].astype(str).str[:2]
+    combined_df['PLAZA'] = combined_df['PLAZA'].astype(str).str[:3]
+    combined_df['MERCADO'] = combined_df['MERCADO'].astype(str).str[1:]
+    combined_df['ID_ARTICULO'] = llave_articulo(combined_df['ID_ARTICULO'])
+    combined_df = combined_df.dropna(subset=['VENTA_PERDIDA_PESOS','ID_ARTICULO'])
+    combined_df['ID_ARTICULO'] = combined_df['ID_ARTICULO'].astype('int64')
+    combined_df['VENTA_PERDIDA_PESOS'] = combined_df['VENTA_PERDIDA_PESOS'].round(0).astype('int64')
+    combined_df[['NOMBRE_TIENDA', 'ESTATUS']] = combined_df[['NOMBRE_TIENDA', 'ESTATUS']].astype('category')
+    combined_df = combined_df.rename(columns={
+        'ID_ARTICULO': 'ARTICULO',
+    })
+
+    # Mover la columna 'Día' a la primera posición
+    cols = ['Día', 'Semana Contable'] + [col for col in combined_df.columns if col not in ['Día', 'Semana Contable']]
+    combined_df = combined_df[cols]
+    return combined_df
+
+#---------------------------------------------------------------------
+def venta(venta_semanal):
+    concat_venta = pd.DataFrame()
+
+    for xlsx_file in venta_semanal:
+        try:
+            df2 = pd.read_excel(xlsx_file)
+
+            # Verificar si ya existe la columna 'Semana Contable'
+            if 'Semana Contable' not in df2.columns:
+                print(f"Advertencia: La columna 'Semana Contable' no existe en {xlsx_file}.")
+                continue  # Salta este archivo si no tiene la columna necesaria
+
+            # Asegúrate de que la columna 'Semana Contable' sea de tipo object
+            df2['Semana Contable'] = df2['Semana Contable'].astype(str)
+
+            # Concatenar los datos
+            concat_venta = pd.concat([concat_venta, df2], ignore_index=True)
+
+        except Exception as e:
+            print(f"Error al procesar el archivo {xlsx_file}: {e}")
+
+    # Reorganizar columnas si es necesario
+    if 'Semana Contable' in concat_venta.columns:
+        cols2 = ['Semana Contable'] + [col2 for col2 in concat_venta.columns if col2 not in ['Semana Contable']]
+        concat_venta = concat_venta[cols2]
+
+    # Eliminar columnas específicas no deseadas
+    columnas_a_eliminar = [col for col in concat_venta.columns if 'Unnamed' in col] + ['Metrics']
+    concat_venta = concat_venta.drop(columns=columnas_a_eliminar, errors='ignore')
+    concat_venta['División'] = concat_venta['División'].astype(float).astype(int).astype(str)
+    concat_venta['Plaza'] = concat_venta['Plaza'].astype(float).astype(int).astype(str)
+    concat_venta['Mercado'] = concat_venta['Mercado'].astype(float).astype(int).astype(str)
+    concat_venta['Artículo'] = llave_articulo(concat_venta['Artículo'])
+    concat_venta = concat_venta.dropna(subset=['Artículo'])
+    concat_venta['Artículo'] = concat_venta['Artículo'].astype('int64')
+    concat_venta['Semana Contable'] = concat_venta['Semana Contable'].astype('str')
+    concat_venta['Venta Neta Total'] = concat_venta['Venta Neta Total'].fillna(0).round(0).astype('int64')
+    concat_venta = concat_venta.rename(columns={
+        'Artículo': 'ARTICULO',
+        'División': 'DIVISION',
+        'Plaza': 'PLAZA',
+        'Mercado': 'MERCADO',
+    })
+
+    return concat_venta
+
+#---------------------------------------------------------------------
+# Diccionario de mapeo de códigos de plaza a nombres
+map_plaza = {
+    "100": "Reynosa",
+    "110": "Matamoros",
+    "200": "México",
+    "300": "Jalisco",
+    "400": "Coahuila (Saltillo)",
+    "410": "Coahuila (Torreón)",
+    "500": "Nuevo León",
+    "600": "Baja California (Tijuana)",
+    "610": "Baja California (Ensenada)",
+    "620": "Baja California (Mexicali)",
+    "650": "Sonora (Hermosillo)",
+    "700": "Puebla",
+    "720": "Morelos",
+    "800": "Yucatán",
+    "890": "Quintana Roo",
+}
+
+map_division = {
+    "10": "Coah-Tamps",
+    "20": "México-Península",
+    "30": "Pacífico",
+    "50": "Nuevo León",
+}
+
+plazas_acacia = {
+    "100": "Reynosa",
+    "110": "Matamoros",
+    "200": "México",
+    "300": "Jalisco",
+    "400": "Coahuila (Saltillo)",
+    "410": "Coahuila (Torreón)",
+    "500": "Nuevo León",
+    "600": "Baja California (Tijuana)",
+    "610": "Baja California (Ensenada)",
+    "620": "Baja California (Mexicali)",
+    "650": "Sonora (Hermosillo)",
+    "700": "Puebla",
+    "720": "Morelos",
+    "800": "Yucatán",
+    "890": "Quintana Roo",
+}
+
+#---------------------------------------------------------------------
+class IndiceMaster:
+    # Índice de MASTER: llaves int64 ordenadas (si un artículo se repite gana el último registro)
+    def __init__(self, MASTER):
+        MASTER = MASTER.assign(ARTICULO=llave_articulo(MASTER['ARTICULO'])).dropna(subset=['ARTICULO'])
+        self.MASTER = MASTER.astype({'ARTICULO': 'int64'})
+        self.maestro = self.MASTER.drop_duplicates('ARTICULO', keep='last').sort_values('ARTICULO').reset_index(drop=True)
+        self.llaves = self.maestro['ARTICULO'].to_numpy(dtype='int64')
+
+    def atributo(self, articulos, columna):
+        # Búsqueda binaria de cada artículo en el índice; NaN si no está en MASTER
+        articulos = np.asarray(articulos, dtype='int64')
+        valores = np.full(len(articulos), np.nan, dtype=object)
+        if len(self.llaves) == 0:
+            return valores
+        posiciones = np.minimum(np.searchsorted(self.llaves, articulos), len(self.llaves) - 1)
+        encontrado = self.llaves[posiciones] == articulos
+        valores[encontrado] = self.maestro[columna].to_numpy(dtype=object)[posiciones[encontrado]]
+        return valores
+
+    def descripcion(self, articulos):
+        # Texto para mostrar: DESCRIPCIÓN de MASTER o el código si no está
+        articulos = np.asarray(articulos, dtype='int64')
+        descripciones = self.atributo(articulos, 'DESCRIPCIÓN')
+        faltantes = pd.isna(descripciones)
+        descripciones[faltantes] = articulos[faltantes].astype(str)
+        return descripciones
+
+def enriquecer(VENTA_PERDIDA, VENTA, indice):
+    # Atributos de MASTER, nombres de plaza y división, y la semana en formato legible
+    for columna in ['FAMILIA', 'SEGMENTO', 'SUBCATEGORIA', 'PROVEEDOR']:
+        VENTA_PERDIDA[columna] = indice.atributo(VENTA_PERDIDA['ARTICULO'], columna)
+        VENTA[columna] = indice.atributo(VENTA['ARTICULO'], columna)
+
+    VENTA_PERDIDA = VENTA_PERDIDA.dropna(subset=['PROVEEDOR'])
+
+    # Aplicar el mapeo al DataFrame
+    VENTA['PLAZA'] = VENTA['PLAZA'].apply(lambda x: map_plaza.get(x, x))
+    VENTA_PERDIDA['PLAZA'] = VENTA_PERDIDA['PLAZA'].apply(lambda x: map_plaza.get(x, x))
+
+    VENTA['DIVISION'] = VENTA['DIVISION'].map(map_division)
+    VENTA_PERDIDA['DIVISION'] = VENTA_PERDIDA['DIVISION'].map(map_division)
+
+    VENTA['Semana Contable'] = semana_legible(VENTA['Semana Contable'])
+    VENTA_PERDIDA['Semana Contable'] = semana_legible(VENTA_PERDIDA['Semana Contable'])
+
+    return VENTA_PERDIDA, VENTA
+
+#---------------------------------------------------------------------
+# Particiones por proveedor: un archivo Parquet por PROVEEDOR y por tabla bajo una carpeta
+# por versión de datos; las usa el tablero para las sesiones de un solo proveedor.
+TABLAS_PARTICION = ('venta_perdida', 'venta')
+# Carpetas temporales más viejas que esto son de escrituras que se cayeron a medias
+EDAD_MAXIMA_TEMPORAL = 3600
+
+def nombre_particion(proveedor):
+    return re.sub(r'[^0-9A-Z_-]+', '_', str(proveedor).strip().upper()).strip('_')
+
+def escribir_particiones(VENTA_PERDIDA, VENTA, carpeta):
+    # Se escribe en una carpeta temporal junto a `carpeta` y se renombra al final, para que nadie
+    # lea particiones a medias; las demás carpetas del directorio son versiones anteriores
+    directorio = os.path.dirname(carpeta)
+    os.makedirs(directorio, exist_ok=True)
+    temporal = tempfile.mkdtemp(prefix='.escribiendo-', dir=directorio)
+    try:
+        for tabla, df in zip(TABLAS_PARTICION, (VENTA_PERDIDA, VENTA)):
+            os.makedirs(os.path.join(temporal, tabla))
+            for proveedor, grupo in df.groupby('PROVEEDOR'):
+                grupo.to_parquet(os.path.join(temporal, tabla, f'{nombre_particion(proveedor)}.parquet'), index=False)
+        try:
+            os.rename(temporal, carpeta)
+        except OSError:
+            if not os.path.isdir(carpeta):
+                raise
+            # Otra sesión ya escribió esta versión
+            return
+    finally:
+        # Si la escritura falló o no se renombró, la carpeta temporal no debe quedar en disco
+        shutil.rmtree(temporal, ignore_errors=True)
+
+    # Borrar las versiones anteriores y las carpetas temporales abandonadas
+    for anterior in os.listdir(directorio):
+        ruta = os.path.join(directorio, anterior)
+        if anterior.startswith('.escribiendo-'):
+            # Puede ser la escritura en curso de otra sesión: solo se borran las viejas
+            try:
+                abandonada = time.time() - os.path.getmtime(ruta) > EDAD_MAXIMA_TEMPORAL
+            except OSError:
+                continue
+            if abandonada:
+                shutil.rmtree(ruta, ignore_errors=True)
+        elif ruta != carpeta and not anterior.startswith('.'):
+            shutil.rmtree(ruta, ignore_errors=True)
+
+def leer_particion(carpeta, proveedor):
+    # (VENTA_PERDIDA, VENTA) del proveedor, o None si no tiene datos que mostrar
+    rutas = [os.path.join(carpeta, tabla, f'{nombre_particion(proveedor)}.parquet') for tabla in TABLAS_PARTICION]
+    if not all(os.path.exists(ruta) for ruta in rutas):
+        return None
+    datos = tuple(pd.read_parquet(ruta) for ruta in rutas)
+    # Una partición con solo BYE se queda vacía al filtrar: tampoco hay datos que mostrar
+    if not all((df['FAMILIA'] != 'BYE').any() for df in datos):
+        return None
+    return datos
+
+#---------------------------------------------------------------------
+# Consulta: los filtros del tablero; None (o vacío en plazas) es "Ninguno"
+@dataclass(frozen=True)
+class Consulta:
+    proveedor: Optional[str] = None
+    division: Optional[str] = None
+    plazas: Tuple[str, ...] = ()
+    mercado: Optional[str] = None
+    semana: Optional[str] = None
+    familia: Optional[str] = None
+    categoria: Optional[str] = None
+
+# Columna de los datos para cada filtro, en el orden del tablero (plazas es un filtro de lista)
+COLUMNAS_FILTRO = {
+    'proveedor': 'PROVEEDOR',
+    'division': 'DIVISION',
+    'plazas': 'PLAZA',
+    'mercado': 'MERCADO',
+    'semana': 'Semana Contable',
+    'familia': 'FAMILIA',
+    'categoria': 'SUBCATEGORIA',
+}
+
+def filtrar(VENTA_PERDIDA, VENTA, consulta):
+    # Mismo orden de filtros que el tablero; no modifica los DataFrames de entrada
+    df_venta_perdida_filtrada = VENTA_PERDIDA
+    df_venta_filtrada = VENTA
+
+    for campo, columna in COLUMNAS_FILTRO.items():
+        valor = getattr(consulta, campo)
+        if not valor:
+            continue
+        if campo == 'plazas':
+            df_venta_perdida_filtrada = df_venta_perdida_filtrada[df_venta_perdida_filtrada[columna].isin(valor)]
+            df_venta_filtrada = df_venta_filtrada[df_venta_filtrada[columna].isin(valor)]
+        else:
+            df_venta_perdida_filtrada = df_venta_perdida_filtrada[df_venta_perdida_filtrada[columna] == valor]
+            df_venta_filtrada = df_venta_filtrada[df_venta_filtrada[columna] == valor]
+
+    df_venta_perdida_filtrada = df_venta_perdida_filtrada[df_venta_perdida_filtrada['FAMILIA'] != 'BYE']
+    df_venta_filtrada = df_venta_filtrada[df_venta_filtrada['FAMILIA'] != 'BYE']
+    return df_venta_perdida_filtrada, df_venta_filtrada
+
+#---------------------------------------------------------------------
+# Índice de co-ocurrencia para las listas de opciones: las combinaciones distintas de los
+# filtros que tienen Venta Perdida y Venta a la vez (sin BYE), como una matriz de códigos.
+# Las opciones de un filtro son los valores que co-ocurren con los demás filtros elegidos;
+# calcularlas es una máscara sobre unos miles de combinaciones en lugar de recorrer los datos.
+class IndiceOpciones:
+    def __init__(self, VENTA_PERDIDA, VENTA):
+        columnas = list(COLUMNAS_FILTRO.values())
+        combinaciones = VENTA_PERDIDA[columnas].drop_duplicates().merge(VENTA[columnas].drop_duplicates())
+        combinaciones = combinaciones[combinaciones['FAMILIA'] != 'BYE']
+
+        # Valores de cada filtro en orden de aparición y su código en la matriz
+        self.valores = {}
+        self.codigo = {}
+        codigos = []
+        for campo, columna in COLUMNAS_FILTRO.items():
+            codigos_campo, valores = pd.factorize(combinaciones[columna])
+            self.valores[campo] = np.asarray(valores, dtype=object)
+            self.codigo[campo] = {valor: i for i, valor in enumerate(self.valores[campo])}
+            codigos.append(codigos_campo)
+        self.codigos = np.column_stack(codigos) if codigos[0].size else np.empty((0, len(codigos)), dtype='int64')
+        self.posicion = {campo: j for j, campo in enumerate(COLUMNAS_FILTRO)}
+
+    def condicion(self, campo, valor):
+        # Combinaciones donde el filtro toma el valor (o alguno de los valores, en plazas).
+        # factorize deja NaN con código -1: un valor desconocido usa -2 para no coincidir con NaN
+        columna = self.codigos[:, self.posicion[campo]]
+        if campo == 'plazas':
+            return np.isin(columna, [self.codigo[campo].get(plaza, -2) for plaza in valor])
+        return columna == self.codigo[campo].get(valor, -2)
+
+    def mascara(self, consulta, excepto=None):
+        mascara = np.ones(len(self.codigos), dtype=bool)
+        for campo in COLUMNAS_FILTRO:
+            valor = getattr(consulta, campo)
+            if valor and campo != excepto:
+                mascara &= self.condicion(campo, valor)
+        return mascara
+
+    def opciones(self, consulta, campo):
+        # Valores del filtro que co-ocurren con los demás filtros de la consulta
+        # Las combinaciones con NaN en el filtro cuentan para los demás filtros, pero no son una opción
+        presentes = np.unique(self.codigos[self.mascara(consulta, excepto=campo), self.posicion[campo]])
+        return list(self.valores[campo][presentes[presentes >= 0]])
+
+    def depurar(self, consulta):
+        # Quita, en el orden del tablero, lo que ya no co-ocurre con los filtros anteriores;
+        # así la consulta resultante siempre tiene datos
+        mascara = np.ones(len(self.codigos), dtype=bool)
+        cambios = {}
+        for campo in COLUMNAS_FILTRO:
+            valor = getattr(consulta, campo)
+            if not valor:
+                continue
+            if campo == 'plazas':
+                valor = tuple(plaza for plaza in valor if (mascara & self.condicion(campo, (plaza,))).any())
+                cambios[campo] = valor
+                if not valor:
+                    continue
+            elif not (mascara & self.condicion(campo, valor)).any():
+                cambios[campo] = None
+                continue
+            mascara &= self.condicion(campo, valor)
+        consulta = replace(consulta, **cambios)
+
+        # Las plazas solo se revisaron contra los filtros de arriba; también deben co-ocurrir con
+        # los de abajo, porque la lista de plazas se arma con todos los demás filtros
+        if consulta.plazas:
+            demas = self.mascara(consulta, excepto='plazas')
+            consulta = replace(consulta, plazas=tuple(
+                plaza for plaza in consulta.plazas if (demas & self.condicion('plazas', (plaza,))).any()
+            ))
+        return consulta
+
+#---------------------------------------------------------------------
+# Agregados: Venta Perdida, Venta Neta y % por las columnas pedidas
+def agregado(df_venta_perdida_filtrada, df_venta_filtrada, por):
+    por = list(por)
+    vp = df_venta_perdida_filtrada.groupby(por)['VENTA_PERDIDA_PESOS'].sum()
+    vn = df_venta_filtrada.groupby(por)['Venta Neta Total'].sum()
+    df_combined = pd.concat([vp, vn], axis=1).reset_index()
+    df_combined['% Venta Perdida'] = (df_combined['VENTA_PERDIDA_PESOS'] / df_combined['Venta Neta Total'].replace(0, np.nan)) * 100
+    return df_combined
+
+def agregado_articulo(df_venta_perdida_filtrada, df_venta_filtrada, indice):
+    df_combined = agregado(df_venta_perdida_filtrada, df_venta_filtrada, ['ARTICULO'])
+    df_combined.insert(1, 'DESCRIPCIÓN', indice.descripcion(df_combined['ARTICULO']))
+    return df_combined.sort_values('VENTA_PERDIDA_PESOS', ascending=False)
+
+#--------------------------------------------------------------------
+# Motor de Pareto (80/20): contribuyentes ordenados y su participación acumulada en
+# la Venta Perdida hasta un umbral. Trabaja con arreglos ya agregados y ordena solo
+# los K mayores (argpartition), ampliando K hasta alcanzar el umbral.
+UMBRAL_PARETO = 0.80
+
+DIMENSIONES_PARETO = {
+    'Artículo': 'ARTICULO',
+    'Plaza': 'PLAZA',
+    'Mercado': 'MERCADO',
+    'Proveedor': 'PROVEEDOR',
+}
+
+def totales_por_dimension(df, dimension, columna_valor='VENTA_PERDIDA_PESOS'):
+    # Suma por valor de la dimensión como dos arreglos: claves y totales
+    codigos, claves = pd.factorize(df[dimension])
+    validos = codigos >= 0
+    totales = np.bincount(codigos[validos], weights=df[columna_valor].to_numpy(dtype='float64')[validos], minlength=len(claves))
+    return np.asarray(claves), totales
+
+def indices_pareto(totales, umbral=UMBRAL_PARETO, k_inicial=16):
+    # Índices de los mayores contribuyentes, en orden, hasta cubrir `umbral` del total
+    n = len(totales)
+    total = totales.sum()
+    if n == 0 or total <= 0:
+        return np.array([], dtype='int64')
+    objetivo = umbral * total
+    k = min(k_inicial, n)
+    while True:
+        if k < n:
+            indices = np.argpartition(-totales, k - 1)[:k]
+        else:
+            indices = np.arange(n)
+        indices = indices[np.argsort(-totales[indices], kind='stable')]
+        acumulado = np.cumsum(totales[indices])
+        if acumulado[-1] >= objetivo or k == n:
+            break
+        k = min(n, k * 4)
+    # Incluir al contribuyente que cruza el umbral
+    corte = min(int(np.searchsorted(acumulado, objetivo)) + 1, len(indices))
+    return indices[:corte]
+
+def ranking_pareto(claves, totales, umbral=UMBRAL_PARETO, nombre_clave='CLAVE'):
+    indices = indices_pareto(totales, umbral)
+    total = totales.sum()
+    ranking = pd.DataFrame({
+        'Rango': np.arange(1, len(indices) + 1),
+        nombre_clave: claves[indices],
+        'VENTA_PERDIDA_PESOS': totales[indices],
+    })
+    ranking['% del total'] = (ranking['VENTA_PERDIDA_PESOS'] / total * 100) if total > 0 else np.nan
+    ranking['% acumulado'] = ranking['% del total'].cumsum()
+    return ranking
+
+def pareto(df, dimension, umbral=UMBRAL_PARETO):
+    claves, totales = totales_por_dimension(df, dimension)
+    return ranking_pareto(claves, totales, umbral, nombre_clave=dimension)
+
+#---------------------------------------------------------------------
+# KPIs principales (últimas semanas de la selección)
+def calcular_kpis(df_venta_perdida_filtrada, df_venta_filtrada, indice):
+    def pick(df, opciones):
+        return next((c for c in opciones if c in df.columns), None)
+
+    col_articulo = pick(df_venta_perdida_filtrada, ["ARTICULO","Artículo","ARTÍCULO"])
+    col_plaza    = pick(df_venta_perdida_filtrada, ["PLAZA","Plaza"])
+    col_mercado  = pick(df_venta_perdida_filtrada, ["MERCADO","Mercado"])
+    col_semana   = pick(df_venta_perdida_filtrada, ["Semana Contable","SEMANA_CONTABLE"])
+
+    # Agregar cada lado por llave antes de unir: cada llave queda con una sola fila por lado,
+    # así las sumas no se multiplican por las filas repetidas del otro lado.
+    llaves = [col_articulo,col_plaza,col_mercado,col_semana]
+    vp = df_venta_perdida_filtrada.groupby(llaves, dropna=False)["VENTA_PERDIDA_PESOS"].sum()
+    vn = df_venta_filtrada.groupby(llaves, dropna=False)["Venta Neta Total"].sum()
+    df_combined = pd.concat([vp, vn], axis=1, join="inner").reset_index()
+
+    df_combined['% Venta Perdida'] = (
+        df_combined['VENTA_PERDIDA_PESOS'] /
+        df_combined['Venta Neta Total'].replace(0, np.nan)
+    ) * 100
+
+    # Sin artículos con Venta Perdida y Venta en común no hay KPIs que mostrar
+    if df_combined.empty:
+        return None
+
+    # Últimas 3 semanas
+    ult_3_sem = sorted(df_combined[col_semana].unique(), reverse=True)[:3]
+    df_3sem = df_combined[df_combined[col_semana].isin(ult_3_sem)]
+
+    # 1️⃣ Artículo → en %: entre los artículos 80/20 de Venta Perdida, el de mayor % VP
+    art_grp = (
+        df_3sem.groupby(col_articulo)[["Venta Neta Total","VENTA_PERDIDA_PESOS"]]
+        .sum()
+        .assign(pct=lambda d: (d["VENTA_PERDIDA_PESOS"]/d["Venta Neta Total"].replace(0,np.nan))*100)
+    )
+    art_80_20 = indices_pareto(art_grp["VENTA_PERDIDA_PESOS"].to_numpy(dtype="float64"))
+    art_kpi = (art_grp.iloc[art_80_20] if len(art_80_20) else art_grp).sort_values("pct", ascending=False).head(1)
+    art_code = art_kpi.index[0]
+    art_desc = indice.descripcion([art_code])[0]
+    art_pct  = art_kpi["pct"].iloc[0]
+
+    # 2️⃣ Plaza → en pesos $
+    ultima_sem = max(df_combined[col_semana])
+    plaza_grp = (
+        df_combined[df_combined[col_semana]==ultima_sem]
+        .groupby(col_plaza)["VENTA_PERDIDA_PESOS"]
+        .sum()
+    )
+    plaza_kpi = plaza_grp.idxmax()
+    plaza_vp  = plaza_grp.max()
+
+    # 3️⃣ Mercado → en pesos $
+    mercado_grp = (
+        df_3sem.groupby(col_mercado)["VENTA_PERDIDA_PESOS"]
+        .sum()
+    )
+    mercado_kpi = mercado_grp.idxmax()
+    mercado_vp  = mercado_grp.max()
+
+    return {
+        "Articulo": (art_desc, art_pct),
+        "Plaza": (plaza_kpi, plaza_vp),
+        "Mercado": (mercado_kpi, mercado_vp)
+    }
+
+#---------------------------------------------------------------------
+# Motor de tendencias: media móvil de 4 semanas, cambio semana contra semana y
+# z-score del % de Venta Perdida para cada serie (plaza, división, mercado, proveedor, artículo).
+# Trabaja sobre matrices serie × semana; cuando llegan datos nuevos solo recalcula
+# la última semana conocida (puede venir incompleta) y las semanas nuevas.
+VENTANA_TENDENCIA = 4
+VENTANA_ZSCORE = 4
+UMBRAL_ZSCORE = 2.0
+# Semanas previas que necesita una semana para calcular sus estadísticas
+CONTEXTO_TENDENCIA = max(VENTANA_TENDENCIA, VENTANA_ZSCORE + 1)
+
+DIMENSIONES_TENDENCIA = {
+    'Total': None,
+    'Plaza': 'PLAZA',
+    'División': 'DIVISION',
+    'Mercado': 'MERCADO',
+    'Proveedor': 'PROVEEDOR',
+    'Artículo': 'ARTICULO',
+}
+
+COLUMNAS_TENDENCIA = {
+    'vp': 'VENTA_PERDIDA_PESOS',
+    'vn': 'Venta Neta Total',
+    'pct': '% Venta Perdida',
+    'ma': 'Media móvil 4 sem',
+    'delta': 'Δ semanal',
+    'z': 'z-score',
+}
+
+def matriz_semanal(df, columna_valor, dimension, semanas):
+    # Serie × semana con la suma de la columna; dimension=None es una sola serie 'Total'
+    df = df[df['Semana Contable'].isin(semanas)]
+    serie = df[dimension] if dimension else pd.Series('Total', index=df.index)
+    matriz = df.groupby([serie.rename('SERIE'), df['Semana Contable']])[columna_valor].sum().unstack('Semana Contable')
+    return matriz.reindex(columns=semanas)
+
+def estadisticas_ventana(pct):
+    # Rolling sobre el eje de semanas para todas las series a la vez
+    por_semana = pct.T
+    previas = por_semana.shift(1)
+    media = previas.rolling(VENTANA_ZSCORE, min_periods=2).mean()
+    desviacion = previas.rolling(VENTANA_ZSCORE, min_periods=2).std()
+    return {
+        'ma': por_semana.rolling(VENTANA_TENDENCIA, min_periods=1).mean().T,
+        'delta': pct.diff(axis=1),
+        'z': ((por_semana - media) / desviacion.replace(0, np.nan)).T,
+    }
+
+def estado_tendencia_vacio():
+    return {'version': None, 'vp': None, 'vn': None, 'pct': None, 'ma': None, 'delta': None, 'z': None,
+            'huellas': None, 'larga': None, 'candado': threading.Lock()}
+
+def huellas_semanales(df_venta_perdida_filtrada, df_venta_filtrada, semanas):
+    # Huella de cada semana: filas y suma de cada tabla. Si cambia (un CSV diario que llega
+    # tarde, una corrección) hay que recalcular esa semana aunque su etiqueta ya se conozca
+    vp = df_venta_perdida_filtrada.groupby('Semana Contable')['VENTA_PERDIDA_PESOS'].agg(['size', 'sum'])
+    vn = df_venta_filtrada.groupby('Semana Contable')['Venta Neta Total'].agg(['size', 'sum'])
+    huellas = pd.concat([vp, vn], axis=1).reindex(semanas)
+    return {semana: tuple(fila) for semana, fila in zip(semanas, huellas.itertuples(index=False))}
+
+def actualizar_tendencia(estado, df_venta_perdida_filtrada, df_venta_filtrada, dimension):
+    semanas = sorted(set(df_venta_perdida_filtrada['Semana Contable']).intersection(set(df_venta_filtrada['Semana Contable'])))
+    if not semanas:
+        # Sin semanas en común no hay series: el estado queda vacío
+        for clave in list(COLUMNAS_TENDENCIA) + ['huellas']:
+            estado[clave] = None
+        return
+    conocidas = list(estado['pct'].columns) if estado['pct'] is not None else []
+    huellas = huellas_semanales(df_venta_perdida_filtrada, df_venta_filtrada, semanas)
+    anteriores = estado['huellas'] or {}
+
+    # Se conservan las semanas iniciales que ya se conocían con la misma huella; desde la
+    # primera semana nueva o cambiada se recalcula todo (sus estadísticas arrastran a las siguientes)
+    primera = 0
+    while (primera < min(len(semanas), len(conocidas)) and semanas[primera] == conocidas[primera]
+           and huellas[semanas[primera]] == anteriores.get(semanas[primera])):
+        primera += 1
+    fijas = semanas[:primera]
+    recalcular = semanas[primera:]
+    estado['huellas'] = huellas
+
+    if not recalcular:
+        # Nada nuevo ni cambiado; solo se quitan las semanas que ya no están
+        for clave in COLUMNAS_TENDENCIA:
+            estado[clave] = estado[clave][fijas]
+        return
+
+    vp = pd.concat([estado['vp'][fijas] if fijas else None,
+                    matriz_semanal(df_venta_perdida_filtrada, 'VENTA_PERDIDA_PESOS', dimension, recalcular)], axis=1)
+    vn = pd.concat([estado['vn'][fijas] if fijas else None,
+                    matriz_semanal(df_venta_filtrada, 'Venta Neta Total', dimension, recalcular)], axis=1)
+    pct = (vp / vn.replace(0, np.nan)) * 100
+
+    # Estadísticas solo para las semanas recalculadas, con las semanas previas justas como contexto
+    inicio = max(0, len(fijas) - CONTEXTO_TENDENCIA)
+    nuevas = estadisticas_ventana(pct.iloc[:, inicio:])
+    for clave, matriz in nuevas.items():
+        matriz = matriz[recalcular]
+        estado[clave] = pd.concat([estado[clave][fijas], matriz], axis=1).reindex(pct.index) if fijas else matriz
+
+    estado['vp'], estado['vn'], estado['pct'] = vp, vn, pct
+
+def tendencia_larga(estado):
+    # Formato largo: una fila por serie y semana con datos
+    if estado['pct'] is None:
+        return pd.DataFrame(columns=['SERIE', 'Semana Contable'] + list(COLUMNAS_TENDENCIA.values()))
+    larga = pd.concat(
+        {nombre: estado[clave].stack(dropna=False) for clave, nombre in COLUMNAS_TENDENCIA.items()},
+        axis=1,
+    )
+    larga = larga.dropna(subset=['% Venta Perdida']).reset_index()
+    return larga.rename(columns={'level_0': 'SERIE', 'level_1': 'Semana Contable'})
+
+def media_movil_sobre_total(larga, larga_total):
+    # Media móvil de la Venta Perdida de cada serie sobre la Venta Neta total de la semana
+    # (no sobre la venta de la propia serie), con la misma ventana que el motor
+    columnas = ['SERIE', 'Semana Contable', COLUMNAS_TENDENCIA['ma']]
+    if larga.empty or larga_total.empty:
+        return pd.DataFrame(columns=columnas)
+    vn_total = larga_total.set_index('Semana Contable')['Venta Neta Total']
+    vp = larga.pivot(index='Semana Contable', columns='SERIE', values='VENTA_PERDIDA_PESOS').reindex(vn_total.index)
+    pct = vp.div(vn_total.replace(0, np.nan), axis=0) * 100
+    ma = pct.rolling(VENTANA_TENDENCIA, min_periods=1).mean().where(pct.notna())
+    ma = ma.stack(dropna=False).dropna().rename(COLUMNAS_TENDENCIA['ma']).reset_index()
+    return ma[columnas]
+
+def tendencias_al_dia(estado, version, df_venta_perdida_filtrada, df_venta_filtrada, dimension):
+    # Actualiza el estado si cambió la versión de los datos y devuelve la tabla larga
+    with estado['candado']:
+        if estado['version'] != version:
+            actualizar_tendencia(estado, df_venta_perdida_filtrada, df_venta_filtrada, dimension)
+            estado['larga'] = tendencia_larga(estado)
+            estado['version'] = version
+    return estado['larga']
+
+def alertas_tendencia(tendencias_por_dimension, indice):
+    # Series cuya última semana sube contra la anterior y se sale de su comportamiento reciente
+    columnas = ['Dimensión', 'SERIE', 'Semana Contable'] + list(COLUMNAS_TENDENCIA.values())
+    alertas = []
+    for nombre, larga in tendencias_por_dimension.items():
+        if larga.empty:
+            continue
+        ultima = larga[larga['Semana Contable'] == larga['Semana Contable'].max()]
+        empeora = ultima[(ultima['Δ semanal'] > 0) & (ultima['z-score'] >= UMBRAL_ZSCORE)]
+        alertas.append(empeora.assign(Dimensión=nombre))
+    if not alertas:
+        return pd.DataFrame(columns=columnas)
+    alertas = pd.concat(alertas, ignore_index=True)
+    # Mostrar la descripción en lugar del código de artículo
+    es_articulo = alertas['Dimensión'] == 'Artículo'
+    alertas.loc[es_articulo, 'SERIE'] = indice.descripcion(alertas.loc[es_articulo, 'SERIE'])
+    return alertas[columnas].sort_values('z-score', ascending=False)
+
+#---------------------------------------------------------------------
+# Riesgo de desabasto: para cada tienda × artículo del último corte, días de cobertura
+# (inventario / venta diaria en unidades) y un riesgo de 0 a 1 que combina la falta de
+# cobertura en el horizonte con la recurrencia del desabasto en los días previos.
+# Todo con arreglos de NumPy sobre la tabla completa, sin groupby ni apply.
+HORIZONTE_RIESGO = 7            # días: "la próxima semana"
+VENTANA_RECURRENCIA = 7         # días previos (incluye el corte) para medir la recurrencia
+ESTATUS_DESABASTO = 'DESABASTO'
+MAX_ARTICULOS_RIESGO = 50
+
+COLUMNAS_RIESGO = [
+    'NUM_TIENDA', 'NOMBRE_TIENDA', 'PLAZA', 'MERCADO', 'ARTICULO', 'DESCRIPCIÓN',
+    'INVENTARIO_UDS', 'VENTA_UDS_PTD', 'Días de cobertura', 'Días en desabasto',
+    'Riesgo', 'VP esperada próxima semana',
+]
+
+def numeros(df, columna):
+    return np.nan_to_num(df[columna].to_numpy(dtype='float64'), nan=0.0)
+
+def riesgo_desabasto(df_venta_perdida_filtrada, indice, max_articulos=MAX_ARTICULOS_RIESGO):
+    df = df_venta_perdida_filtrada
+    if df.empty:
+        return pd.DataFrame(columns=COLUMNAS_RIESGO)
+
+    # Días como enteros; el corte es el último día con datos en la selección
+    dias = df['Fecha'].to_numpy(dtype='datetime64[D]').astype('int64')
+    corte = dias.max()
+    en_ventana = dias > corte - VENTANA_RECURRENCIA
+    dias_observados = len(np.unique(dias[en_ventana]))
+
+    # Llave tienda × artículo a partir de los códigos de factorize de cada columna
+    codigos_tienda, tiendas = pd.factorize(df['NUM_TIENDA'])
+    codigos_articulo, articulos = pd.factorize(df['ARTICULO'])
+    codigos, _ = pd.factorize(codigos_tienda.astype('int64') * len(articulos) + codigos_articulo)
+
+    # Días en desabasto por tienda × artículo dentro de la ventana (una fila por tienda, artículo y día)
+    desabasto = en_ventana & (df['ESTATUS'].to_numpy() == ESTATUS_DESABASTO)
+    dias_desabasto = np.bincount(codigos[desabasto], minlength=codigos.max() + 1)
+
+    # Estado de cada tienda × artículo en el corte
+    actual = np.flatnonzero(dias == corte)
+    inventario_uds = numeros(df, 'INVENTARIO_UDS')[actual]
+    venta_uds = numeros(df, 'VENTA_UDS_PTD')[actual]
+    cobertura = np.divide(inventario_uds, venta_uds, out=np.full(len(actual), np.inf), where=venta_uds > 0)
+    riesgo_cobertura = np.clip(1 - cobertura / HORIZONTE_RIESGO, 0, 1)
+    recurrencia = dias_desabasto[codigos[actual]] / max(dias_observados, 1)
+    riesgo = riesgo_cobertura * recurrencia
+
+    # Pesos que el inventario no alcanza a cubrir en el horizonte, ponderados por el riesgo
+    faltante = np.maximum(HORIZONTE_RIESGO * numeros(df, 'VENTA_PESOS_PTD')[actual] - numeros(df, 'INVENTARIO_PESOS')[actual], 0)
+    esperada = riesgo * faltante
+
+    # Solo se ordenan los K mayores
+    k = min(max_articulos, len(actual))
+    mayores = np.argpartition(-esperada, k - 1)[:k] if k < len(actual) else np.arange(len(actual))
+    mayores = mayores[np.argsort(-esperada[mayores], kind='stable')]
+    filas = actual[mayores]
+
+    ranking = pd.DataFrame({
+        'NUM_TIENDA': df['NUM_TIENDA'].to_numpy()[filas],
+        'NOMBRE_TIENDA': df['NOMBRE_TIENDA'].to_numpy()[filas],
+        'PLAZA': df['PLAZA'].to_numpy()[filas],
+        'MERCADO': df['MERCADO'].to_numpy()[filas],
+        'ARTICULO': df['ARTICULO'].to_numpy()[filas],
+        'DESCRIPCIÓN': indice.descripcion(df['ARTICULO'].to_numpy()[filas]),
+        'INVENTARIO_UDS': inventario_uds[mayores],
+        'VENTA_UDS_PTD': venta_uds[mayores],
+        'Días de cobertura': cobertura[mayores],
+        'Días en desabasto': dias_desabasto[codigos[filas]],
+        'Riesgo': riesgo[mayores],
+        'VP esperada próxima semana': esperada[mayores],
+    })
+    return ranking[ranking['VP esperada próxima semana'] > 0].reset_index(drop=True)
+
+#---------------------------------------------------------------------
+# Exportación por bloques: cada generador entrega el archivo en partes de
+# TAMANO_BLOQUE_EXPORTACION filas para enviarlas mientras se generan (CSV y Parquet).
+# XLSX solo se puede armar completo y openpyxl retiene el GIL mientras tanto (unos 2 s por
+# cada 10,000 filas de 20 columnas), así que tiene un tope bajo para no frenar a las demás sesiones.
+TAMANO_BLOQUE_EXPORTACION = 50_000
+MAX_FILAS_XLSX = 10_000
+
+FORMATOS_EXPORTACION = {
+    'CSV': ('csv', 'text/csv'),
+    'Parquet': ('parquet', 'application/octet-stream'),
+    'XLSX': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+# Nombre visible -> nombre de archivo (también es el valor de `conjunto` en la API)
+CONJUNTOS_EXPORTACION = {
+    'Detalle Venta Perdida': 'detalle_venta_perdida',
+    'Detalle Venta': 'detalle_venta',
+    'Semana × Plaza': 'semana_plaza',
+    'Artículo': 'articulo',
+}
+
+class SalidaPorBloques(RawIOBase):
+    # Archivo de solo escritura que se vacía después de cada bloque; lleva la posición
+    # para que pyarrow y zipfile (xlsx) calculen bien sus offsets
+    def __init__(self):
+        self.partes = []
+        self.posicion = 0
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        datos = bytes(datos)
+        self.partes.append(datos)
+        self.posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self.posicion
+
+    def drenar(self):
+        datos = b''.join(self.partes)
+        self.partes = []
+        return datos
+
+def bloques_de(df, tamano=TAMANO_BLOQUE_EXPORTACION):
+    for inicio in range(0, len(df), tamano):
+        yield df.iloc[inicio:inicio + tamano]
+
+def generar_csv(df):
+    encabezado = True
+    for bloque in bloques_de(df):
+        yield bloque.to_csv(index=False, header=encabezado).encode('utf-8')
+        encabezado = False
+
+def generar_parquet(df):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Esquema de todo el DataFrame para que todos los bloques coincidan (p. ej. un bloque sin FAMILIA)
+    esquema = pa.Schema.from_pandas(df, preserve_index=False)
+    salida = SalidaPorBloques()
+    escritor = pq.ParquetWriter(salida, esquema)
+    for bloque in bloques_de(df):
+        escritor.write_table(pa.Table.from_pandas(bloque, schema=esquema, preserve_index=False))
+        yield salida.drenar()
+    escritor.close()
+    yield salida.drenar()
+
+def generar_xlsx(df):
+    # Libro en modo write_only: openpyxl guarda las filas en disco, no en memoria
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet('Datos')
+    hoja.append([str(col) for col in df.columns])
+    for bloque in bloques_de(df):
+        bloque = bloque.astype(object).where(bloque.notna(), None)
+        for fila in bloque.itertuples(index=False, name=None):
+            hoja.append(fila)
+    salida = SalidaPorBloques()
+    libro.save(salida)
+    yield salida.drenar()
+
+generadores_exportacion = {
+    'CSV': generar_csv,
+    'Parquet': generar_parquet,
+    'XLSX': generar_xlsx,
+}
+
+def guardar_exportacion(partes, ruta):
+    # Escribe en disco cada parte en cuanto se genera; en memoria solo queda un bloque a la vez.
+    # El archivo aparece completo o no aparece (se escribe aparte y se renombra al final).
+    temporal = f'{ruta}.parcial'
+    try:
+        with open(temporal, 'wb') as archivo:
+            for parte in partes:
+                archivo.write(parte)
+        os.replace(temporal, ruta)
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+    return os.path.getsize(ruta)
+
+def datos_exportacion(conjunto, df_venta_perdida_filtrada, df_venta_filtrada, indice):
+    # DataFrame de cada conjunto, armado al momento de exportar
+    if conjunto == 'detalle_venta_perdida':
+        return df_venta_perdida_filtrada
+    if conjunto == 'detalle_venta':
+        return df_venta_filtrada
+    if conjunto == 'semana_plaza':
+        return agregado(df_venta_perdida_filtrada, df_venta_filtrada, ['Semana Contable', 'PLAZA'])
+    if conjunto == 'articulo':
+        return agregado_articulo(df_venta_perdida_filtrada, df_venta_filtrada, indice)
+    raise ValueError(f'Conjunto de exportación no válido: {conjunto}')
+
+def validar_exportacion(df, formato):
+    if formato not in generadores_exportacion:
+        raise ValueError(f'Formato no válido: {formato}')
+    if formato == 'XLSX' and len(df) > MAX_FILAS_XLSX:
+        raise ValueError(f'XLSX admite hasta {MAX_FILAS_XLSX:,} filas y la selección tiene {len(df):,}; '
+                         f'use CSV o Parquet, o filtre más')
+
+#---------------------------------------------------------------------
+# Motor con los datos calientes en memoria, para consumidores fuera de Streamlit
+class MotorVentaPerdida:
+    def __init__(self, refresco_segundos=3600, max_consultas=64, reintento_segundos=300):
+        self.refresco_segundos = refresco_segundos
+        # Tras una recarga fallida con datos ya cargados, espera antes de volver a consultar GitHub
+        self.reintento_segundos = reintento_segundos
+        self.max_consultas = max_consultas
+        # _candado protege el estado compartido y se toma solo por instantes;
+        # _candado_carga deja una sola recarga en curso, fuera de _candado
+        self._candado = threading.Lock()
+        self._candado_carga = threading.Lock()
+        self._revisado = 0.0
+        self.version = None
+        self.VENTA_PERDIDA = None
+        self.VENTA = None
+        self.indice = None
+        self.indice_opciones = None
+        # Resultados recientes por (versión, consulta): DataFrames filtrados y estados de tendencia
+        self._filtrados = OrderedDict()
+        self._tendencias = OrderedDict()
+
+    def _vigente(self):
+        return self.version is not None and time.time() - self._revisado < self.refresco_segundos
+
+    def cargar(self, forzar=False):
+        # Revisa GitHub cada `refresco_segundos` y recarga solo si cambió la versión
+        with self._candado:
+            if not forzar and self._vigente():
+                return self.version
+        # Con datos ya cargados, las consultas siguen con la versión actual mientras otro hilo recarga
+        if not self._candado_carga.acquire(blocking=forzar or self.version is None):
+            return self.version
+        try:
+            with self._candado:
+                # Otro hilo pudo terminar la recarga mientras se esperaba
+                if not forzar and self._vigente():
+                    return self.version
+            try:
+                self._recargar(forzar)
+            except Exception as e:
+                # Sin datos no hay con qué responder; con datos, se sigue con la versión actual
+                if self.version is None:
+                    raise
+                print(f"Error al recargar los datos de Venta Perdida, se mantiene la versión {self.version}: {e}")
+                with self._candado:
+                    self._revisado = time.time() - self.refresco_segundos + self.reintento_segundos
+                    return self.version
+            with self._candado:
+                self._revisado = time.time()
+                return self.version
+        finally:
+            self._candado_carga.release()
+
+    def _recargar(self, forzar):
+        csv_files = list_files_in_github_folder(csv_folder_url)
+        venta_semanal = list_files_in_github_folder(venta_semanal_folder_url)
+        version = version_de_datos(csv_files, venta_semanal)
+        if forzar or version != self.version:
+            indice = IndiceMaster(pd.read_excel(download_file_from_github(master_github_url)))
+            VENTA_PERDIDA, VENTA = enriquecer(venta_perdida(csv_files), venta(venta_semanal), indice)
+            indice_opciones = IndiceOpciones(VENTA_PERDIDA, VENTA)
+            # Se reemplaza todo junto para que ninguna consulta mezcle versiones
+            with self._candado:
+                self.VENTA_PERDIDA, self.VENTA, self.indice = VENTA_PERDIDA, VENTA, indice
+                self.indice_opciones = indice_opciones
+                self.version = version
+                self._filtrados.clear()
+
+    def _datos(self):
+        # (versión, VENTA_PERDIDA, VENTA, índice maestro, índice de opciones) de una misma carga
+        self.cargar()
+        with self._candado:
+            return self.version, self.VENTA_PERDIDA, self.VENTA, self.indice, self.indice_opciones
+
+    def _recordar(self, cache, llave, crear):
+        with self._candado:
+            if llave in cache:
+                cache.move_to_end(llave)
+                return cache[llave]
+        valor = crear()
+        with self._candado:
+            cache[llave] = valor
+            while len(cache) > self.max_consultas:
+                cache.popitem(last=False)
+        return valor
+
+    def _filtrar(self, consulta):
+        # (versión, índice maestro, VP filtrada, Venta filtrada), todo de la misma carga
+        version, VENTA_PERDIDA, VENTA, indice, _ = self._datos()
+        filtrados = self._recordar(self._filtrados, (version, consulta), lambda: filtrar(VENTA_PERDIDA, VENTA, consulta))
+        return (version, indice) + filtrados
+
+    def filtrar(self, consulta):
+        return self._filtrar(consulta)[2:]
+
+    def opciones(self, consulta):
+        # Opciones de cada filtro que co-ocurren con los demás, tras quitar lo que ya no aplica
+        indice_opciones = self._datos()[4]
+        consulta = indice_opciones.depurar(consulta)
+        return {campo: indice_opciones.opciones(consulta, campo) for campo in COLUMNAS_FILTRO}
+
+    def kpis(self, consulta):
+        _, indice, df_venta_perdida_filtrada, df_venta_filtrada = self._filtrar(consulta)
+        kpis = calcular_kpis(df_venta_perdida_filtrada, df_venta_filtrada, indice)
+        if kpis is None:
+            return {}
+        return {nombre: {'valor': valor, 'monto': float(monto)} for nombre, (valor, monto) in kpis.items()}
+
+    def agregado(self, consulta, por):
+        _, indice, df_venta_perdida_filtrada, df_venta_filtrada = self._filtrar(consulta)
+        if list(por) == ['ARTICULO']:
+            return agregado_articulo(df_venta_perdida_filtrada, df_venta_filtrada, indice)
+        return agregado(df_venta_perdida_filtrada, df_venta_filtrada, por)
+
+    def pareto(self, consulta, dimension, umbral=UMBRAL_PARETO):
+        _, indice, df_venta_perdida_filtrada, _ = self._filtrar(consulta)
+        ranking = pareto(df_venta_perdida_filtrada, dimension, umbral)
+        if dimension == 'ARTICULO':
+            ranking.insert(2, 'DESCRIPCIÓN', indice.descripcion(ranking['ARTICULO']))
+        return ranking
+
+    def tendencias(self, consulta, dimension):
+        version, _, df_venta_perdida_filtrada, df_venta_filtrada = self._filtrar(consulta)
+        # El estado sobrevive a los cambios de versión para actualizarse de forma incremental
+        estado = self._recordar(self._tendencias, (dimension, consulta), estado_tendencia_vacio)
+        return tendencias_al_dia(estado, version, df_venta_perdida_filtrada, df_venta_filtrada, dimension)
+
+    def riesgo(self, consulta, max_articulos=MAX_ARTICULOS_RIESGO):
+        _, indice, df_venta_perdida_filtrada, _ = self._filtrar(consulta)
+        return riesgo_desabasto(df_venta_perdida_filtrada, indice, max_articulos)
+
+    def exportar(self, consulta, conjunto, formato):
+        # (nombre de archivo, tipo MIME, generador de partes); valida antes de generar nada
+        _, indice, df_venta_perdida_filtrada, df_venta_filtrada = self._filtrar(consulta)
+        df = datos_exportacion(conjunto, df_venta_perdida_filtrada, df_venta_filtrada, indice)
+        validar_exportacion(df, formato)
+        extension, mime = FORMATOS_EXPORTACION[formato]
+        return f'venta_perdida_{conjunto}.{extension}', mime, generadores_exportacion[formato](df)
+
+    def alertas(self, consulta):
+        tendencias = {nombre: self.tendencias(consulta, dimension) for nombre, dimension in DIMENSIONES_TENDENCIA.items()}
+        return alertas_tendencia(tendencias, self._datos()[3])
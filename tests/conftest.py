@@ -0,0 +1,29 @@
+# Configuración común de las pruebas: el motor vive en folder/ y se importa sin Streamlit
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'folder'))
+
+def fila(proveedor, division, plaza, mercado, semana, familia, categoria, articulo, valor):
+    return {
+        'PROVEEDOR': proveedor, 'DIVISION': division, 'PLAZA': plaza, 'MERCADO': mercado,
+        'Semana Contable': semana, 'FAMILIA': familia, 'SUBCATEGORIA': categoria,
+        'ARTICULO': articulo, 'valor': valor,
+    }
+
+@pytest.fixture
+def datos():
+    filas = [
+        fila('PMI', 'Sur', 'Quintana Roo', '920', '2025-Sem 50', 'CIGARRO', 'CAJETILLA', 1, 100),
+        fila('PMI', 'Sur', 'Quintana Roo', '921', '2025-Sem 51', 'CIGARRO', 'CAJETILLA', 2, 50),
+        fila('PMI', 'Centro', 'Puebla', '930', '2025-Sem 50', 'CIGARRO', 'CAJETILLA', 1, 80),
+        fila('BAT', 'Centro', 'Puebla', '930', '2025-Sem 51', 'CIGARRO', 'CAJETILLA', 3, 40),
+        fila('JTI', 'Centro', 'Puebla', '930', '2025-Sem 51', 'BYE', 'CAJETILLA', 4, 999),
+    ]
+    VENTA_PERDIDA = pd.DataFrame(filas).rename(columns={'valor': 'VENTA_PERDIDA_PESOS'})
+    VENTA = pd.DataFrame(filas).rename(columns={'valor': 'Venta Neta Total'})
+    VENTA['Venta Neta Total'] *= 10
+    return VENTA_PERDIDA, VENTA
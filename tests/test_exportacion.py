@@ -0,0 +1,70 @@
+# Pruebas de la exportación por bloques
+from io import BytesIO, StringIO
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from motor_venta_perdida import (
+    MAX_FILAS_XLSX, TAMANO_BLOQUE_EXPORTACION, datos_exportacion, generadores_exportacion, guardar_exportacion,
+    validar_exportacion,
+)
+
+@pytest.fixture
+def detalle():
+    # Dos bloques completos y uno parcial
+    n = 2 * TAMANO_BLOQUE_EXPORTACION + 5
+    return pd.DataFrame({
+        'Semana Contable': [f'2025-Sem {40 + i % 5}' for i in range(n)],
+        'PLAZA': np.resize(np.array(['Puebla', 'Jalisco', None, 'Puebla', 'Sonora'], dtype=object), n),
+        'ARTICULO': pd.array(np.arange(100024280, 100024280 + n), dtype='Int64'),
+        'VENTA_PERDIDA_PESOS': np.arange(n) * 1.5,
+    })
+
+def test_csv_por_bloques_ida_y_vuelta(detalle):
+    partes = list(generadores_exportacion['CSV'](detalle))
+    assert len(partes) == 3
+    # El encabezado va solo en el primer bloque
+    assert sum(parte.count(b'VENTA_PERDIDA_PESOS') for parte in partes) == 1
+    leido = pd.read_csv(StringIO(b''.join(partes).decode('utf-8')), dtype={'ARTICULO': 'Int64'})
+    # CSV no distingue None de NaN
+    pd.testing.assert_frame_equal(leido, detalle.assign(PLAZA=detalle['PLAZA'].where(detalle['PLAZA'].notna(), np.nan)))
+
+def test_parquet_por_bloques_ida_y_vuelta(detalle):
+    partes = list(generadores_exportacion['Parquet'](detalle))
+    assert len(partes) > 1
+    pd.testing.assert_frame_equal(pd.read_parquet(BytesIO(b''.join(partes))), detalle)
+
+def test_xlsx_ida_y_vuelta(detalle):
+    detalle = detalle.head(25)
+    leido = pd.read_excel(BytesIO(b''.join(generadores_exportacion['XLSX'](detalle))))
+    assert list(leido.columns) == list(detalle.columns)
+    assert leido['ARTICULO'].tolist() == detalle['ARTICULO'].tolist()
+    assert leido['PLAZA'].isna().sum() == 5
+
+def test_xlsx_tope_de_filas():
+    validar_exportacion(pd.DataFrame({'a': range(MAX_FILAS_XLSX)}), 'XLSX')
+    with pytest.raises(ValueError, match='XLSX admite'):
+        validar_exportacion(pd.DataFrame({'a': range(MAX_FILAS_XLSX + 1)}), 'XLSX')
+    # El tope solo aplica a XLSX
+    validar_exportacion(pd.DataFrame({'a': range(MAX_FILAS_XLSX + 1)}), 'CSV')
+
+def test_formato_y_conjunto_no_validos(detalle):
+    with pytest.raises(ValueError):
+        validar_exportacion(detalle, 'JSON')
+    with pytest.raises(ValueError):
+        datos_exportacion('todo', detalle, detalle, None)
+
+def test_guardar_exportacion_escribe_las_partes(tmp_path, detalle):
+    ruta = tmp_path / 'detalle.csv'
+    tamano = guardar_exportacion(generadores_exportacion['CSV'](detalle), str(ruta))
+    assert tamano == ruta.stat().st_size
+    assert len(pd.read_csv(ruta)) == len(detalle)
+
+def test_guardar_exportacion_fallida_no_deja_archivos(tmp_path):
+    def partes():
+        yield b'a,b\n'
+        raise OSError('disco lleno')
+    with pytest.raises(OSError):
+        guardar_exportacion(partes(), str(tmp_path / 'detalle.csv'))
+    assert list(tmp_path.iterdir()) == []
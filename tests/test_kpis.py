@@ -0,0 +1,49 @@
+# Pruebas de los KPIs del encabezado
+import pandas as pd
+import pytest
+
+from motor_venta_perdida import IndiceMaster, calcular_kpis
+
+@pytest.fixture
+def indice():
+    return IndiceMaster(pd.DataFrame({'ARTICULO': [1, 2, 3], 'DESCRIPCIÓN': ['MARLBORO ROJO', 'PALL MALL AZUL', 'CAMEL']}))
+
+def filas(articulo, plaza, mercado, semana, valores):
+    return [{'ARTICULO': articulo, 'PLAZA': plaza, 'MERCADO': mercado, 'Semana Contable': semana, 'valor': v} for v in valores]
+
+def tablas(venta_perdida, venta):
+    return (
+        pd.DataFrame(venta_perdida).rename(columns={'valor': 'VENTA_PERDIDA_PESOS'}),
+        pd.DataFrame(venta).rename(columns={'valor': 'Venta Neta Total'}),
+    )
+
+@pytest.fixture
+def datos():
+    venta_perdida, venta = [], []
+    for semana in ['2025-Sem 49', '2025-Sem 50', '2025-Sem 51']:
+        # Varias filas por llave en ambos lados: 60 de VP contra 600 de venta
+        venta_perdida += filas(1, 'Puebla', '930', semana, [10, 20, 30])
+        venta += filas(1, 'Puebla', '930', semana, [300, 300])
+    # Mayor % pero fuera del 80/20 de Venta Perdida
+    venta_perdida += filas(2, 'Sonora', '940', '2025-Sem 51', [5])
+    venta += filas(2, 'Sonora', '940', '2025-Sem 51', [10])
+    # Fuera de las últimas 3 semanas
+    venta_perdida += filas(1, 'Jalisco', '600', '2025-Sem 48', [1000])
+    venta += filas(1, 'Jalisco', '600', '2025-Sem 48', [2000])
+    # Sin venta: no entra a los KPIs ni cuenta como semana
+    venta_perdida += filas(3, 'Sonora', '940', '2025-Sem 52', [500])
+    return tablas(venta_perdida, venta)
+
+def test_kpis(datos, indice):
+    kpis = calcular_kpis(*datos, indice)
+    assert kpis['Articulo'][0] == 'MARLBORO ROJO'
+    # Suma por llave en cada lado: 180 / 1800, sin multiplicar filas
+    assert kpis['Articulo'][1] == pytest.approx(10)
+    # Plaza: última semana con venta (Sem 51), no la Sem 52 que solo tiene Venta Perdida
+    assert kpis['Plaza'] == ('Puebla', 60)
+    # Mercado: últimas 3 semanas, sin la Sem 48
+    assert kpis['Mercado'] == ('930', 180)
+
+def test_kpis_sin_llaves_en_comun(indice):
+    venta_perdida, venta = tablas(filas(1, 'Puebla', '930', '2025-Sem 51', [10]), filas(2, 'Puebla', '930', '2025-Sem 51', [100]))
+    assert calcular_kpis(venta_perdida, venta, indice) is None
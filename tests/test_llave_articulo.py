@@ -0,0 +1,22 @@
+# Pruebas de la llave ARTICULO (int64 validado)
+import numpy as np
+import pandas as pd
+
+from motor_venta_perdida import llave_articulo
+
+def test_llave_articulo_texto_exacto():
+    llaves = llave_articulo(pd.Series(['9007199254740993', ' 100024282 ', '100024282.0', 'abc', None, '']))
+    assert llaves.tolist() == [9007199254740993, 100024282, 100024282, pd.NA, pd.NA, pd.NA]
+
+def test_llave_articulo_fuera_de_rango():
+    llaves = llave_articulo(pd.Series([str(2**63 - 1), str(2**63), str(-2**63), str(-2**63 - 1), '1' * 25]))
+    assert llaves.tolist() == [2**63 - 1, pd.NA, -2**63, pd.NA, pd.NA]
+
+def test_llave_articulo_flotantes_solo_enteros_exactos():
+    llaves = llave_articulo(pd.Series([100024282.0, 1.5, np.nan, np.inf]))
+    assert llaves.tolist() == [100024282, pd.NA, pd.NA, pd.NA]
+
+def test_llave_articulo_enteros_y_texto_mezclado():
+    assert llave_articulo(pd.Series([100024282, 7], dtype='int64')).dtype == 'Int64'
+    # Columna leída como texto con ceros a la izquierda y signo
+    assert llave_articulo(pd.Series(['007', '-12', '1e5'])).tolist() == [7, -12, pd.NA]
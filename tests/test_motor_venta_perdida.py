@@ -0,0 +1,81 @@
+# Pruebas del motor de Venta Perdida con datos pequeños armados a mano (sin GitHub)
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import motor_venta_perdida as motor
+from motor_venta_perdida import Consulta, IndiceOpciones, MotorVentaPerdida, filtrar
+
+#---------------------------------------------------------------------
+# filtrar
+def test_filtrar_sin_filtros_quita_bye(datos):
+    df_vp, df_v = filtrar(*datos, Consulta())
+    assert len(df_vp) == 4 and len(df_v) == 4
+    assert 'BYE' not in set(df_vp['FAMILIA'])
+
+def test_filtrar_plazas_y_otros_filtros(datos):
+    df_vp, df_v = filtrar(*datos, Consulta(proveedor='PMI', plazas=('Puebla', 'Quintana Roo'), semana='2025-Sem 50'))
+    assert sorted(df_vp['PLAZA']) == ['Puebla', 'Quintana Roo']
+    assert df_v['Venta Neta Total'].sum() == 1800
+
+def test_filtrar_no_modifica_las_entradas(datos):
+    VENTA_PERDIDA, VENTA = datos
+    antes = VENTA_PERDIDA.copy()
+    filtrar(VENTA_PERDIDA, VENTA, Consulta(proveedor='PMI'))
+    pd.testing.assert_frame_equal(VENTA_PERDIDA, antes)
+
+#---------------------------------------------------------------------
+# MotorVentaPerdida: una recarga lenta no detiene a las consultas
+def test_recarga_no_bloquea_consultas(datos, monkeypatch):
+    m = MotorVentaPerdida(refresco_segundos=0)
+    m.VENTA_PERDIDA, m.VENTA = datos
+    m.indice_opciones = IndiceOpciones(*datos)
+    m.version = 'v1'
+
+    en_github = threading.Event()
+    soltar = threading.Event()
+    def listado_lento(url):
+        en_github.set()
+        soltar.wait(5)
+        return []
+    monkeypatch.setattr(motor, 'list_files_in_github_folder', listado_lento)
+    monkeypatch.setattr(motor, 'version_de_datos', lambda *archivos: 'v1')
+
+    recarga = threading.Thread(target=m.cargar)
+    recarga.start()
+    assert en_github.wait(5)
+    inicio = time.time()
+    df_vp, _ = m.filtrar(Consulta(proveedor='PMI'))
+    assert time.time() - inicio < 1
+    assert len(df_vp) == 3
+    soltar.set()
+    recarga.join(5)
+    assert not recarga.is_alive()
+
+def test_recarga_fallida_sigue_con_los_datos_cargados(datos, monkeypatch):
+    m = MotorVentaPerdida(refresco_segundos=0, reintento_segundos=60)
+    m.VENTA_PERDIDA, m.VENTA = datos
+    m.indice_opciones = IndiceOpciones(*datos)
+    m.version = 'v1'
+
+    llamadas = []
+    def github_caido(url):
+        llamadas.append(url)
+        raise ConnectionError('403 rate limit')
+    monkeypatch.setattr(motor, 'list_files_in_github_folder', github_caido)
+
+    for _ in range(3):
+        df_vp, _ = m.filtrar(Consulta(proveedor='PMI'))
+        assert len(df_vp) == 3
+    # Solo el primer intento va a GitHub; los demás esperan el reintento
+    assert len(llamadas) == 1
+    assert m.version == 'v1'
+
+def test_primera_carga_fallida_se_propaga(monkeypatch):
+    def github_caido(url):
+        raise ConnectionError('403 rate limit')
+    monkeypatch.setattr(motor, 'list_files_in_github_folder', github_caido)
+    with pytest.raises(ConnectionError):
+        MotorVentaPerdida().cargar()
@@ -0,0 +1,48 @@
+# Pruebas del índice de opciones en cascada del sidebar
+import numpy as np
+
+from motor_venta_perdida import Consulta, IndiceOpciones, filtrar
+
+def test_opciones_coocurren_con_los_demas_filtros(datos):
+    indice = IndiceOpciones(*datos)
+    assert indice.opciones(Consulta(), 'proveedor') == ['PMI', 'BAT']
+    assert indice.opciones(Consulta(proveedor='BAT'), 'plazas') == ['Puebla']
+    # El propio filtro no restringe sus opciones
+    assert indice.opciones(Consulta(proveedor='BAT'), 'proveedor') == ['PMI', 'BAT']
+
+def test_opciones_sin_bye(datos):
+    indice = IndiceOpciones(*datos)
+    assert 'JTI' not in indice.opciones(Consulta(), 'proveedor')
+
+def test_depurar_quita_valores_sin_datos(datos):
+    indice = IndiceOpciones(*datos)
+    consulta = indice.depurar(Consulta(proveedor='BAT', division='Sur'))
+    assert consulta == Consulta(proveedor='BAT')
+
+def test_depurar_revisa_plazas_contra_filtros_de_abajo(datos):
+    # Quintana Roo + Puebla y luego mercado 930: Quintana Roo ya no es una opción de plazas
+    indice = IndiceOpciones(*datos)
+    consulta = indice.depurar(Consulta(plazas=('Puebla', 'Quintana Roo'), mercado='930'))
+    assert consulta.plazas == ('Puebla',)
+    assert set(consulta.plazas) <= set(indice.opciones(consulta, 'plazas'))
+
+def test_opciones_ignoran_nan(datos):
+    # Un código sin DIVISION en MAP_DIVISION queda NaN; factorize le da -1
+    VENTA_PERDIDA, VENTA = (df.copy() for df in datos)
+    for df in (VENTA_PERDIDA, VENTA):
+        df.loc[df['PROVEEDOR'] == 'BAT', 'DIVISION'] = np.nan
+    indice = IndiceOpciones(VENTA_PERDIDA, VENTA)
+    assert indice.opciones(Consulta(), 'division') == ['Sur', 'Centro']
+    # BAT no tiene ninguna división: no se ofrece una que filtrar dejaría vacía
+    assert indice.opciones(Consulta(proveedor='BAT'), 'division') == []
+    assert filtrar(VENTA_PERDIDA, VENTA, Consulta(proveedor='BAT', division='Sur'))[0].empty
+    # La combinación con NaN sigue contando para los demás filtros
+    assert indice.opciones(Consulta(), 'proveedor') == ['PMI', 'BAT']
+
+def test_valor_desconocido_no_coincide_con_nan(datos):
+    VENTA_PERDIDA, VENTA = (df.copy() for df in datos)
+    for df in (VENTA_PERDIDA, VENTA):
+        df.loc[df['PROVEEDOR'] == 'BAT', 'DIVISION'] = np.nan
+    indice = IndiceOpciones(VENTA_PERDIDA, VENTA)
+    assert indice.opciones(Consulta(division='Norte'), 'proveedor') == []
+    assert indice.depurar(Consulta(division='Norte')) == Consulta()
@@ -0,0 +1,30 @@
+# Pruebas del motor de Pareto (80/20)
+import numpy as np
+import pandas as pd
+
+from motor_venta_perdida import indices_pareto, pareto
+
+def test_indices_pareto_incluye_al_que_cruza_el_umbral():
+    totales = np.array([10.0, 50.0, 5.0, 30.0, 5.0])
+    assert list(indices_pareto(totales, 0.8)) == [1, 3]
+    assert list(indices_pareto(totales, 0.81)) == [1, 3, 0]
+
+def test_indices_pareto_amplia_k():
+    rng = np.random.default_rng(0)
+    totales = rng.random(1000)
+    indices = indices_pareto(totales, 0.8, k_inicial=2)
+    orden = np.argsort(-totales, kind='stable')
+    corte = np.searchsorted(np.cumsum(totales[orden]), 0.8 * totales.sum()) + 1
+    assert list(indices) == list(orden[:corte])
+
+def test_indices_pareto_sin_total():
+    assert len(indices_pareto(np.array([]))) == 0
+    assert len(indices_pareto(np.zeros(3))) == 0
+
+def test_pareto_suma_por_dimension():
+    df = pd.DataFrame({'PLAZA': ['Puebla', 'Jalisco', 'Puebla', 'Sonora', None], 'VENTA_PERDIDA_PESOS': [30, 50, 30, 10, 99]})
+    ranking = pareto(df, 'PLAZA', 0.8)
+    # Las filas sin plaza no entran al ranking ni al total
+    assert ranking['PLAZA'].tolist() == ['Puebla', 'Jalisco']
+    assert ranking['VENTA_PERDIDA_PESOS'].tolist() == [60, 50]
+    assert ranking['% acumulado'].round(2).tolist() == [50.0, 91.67]
@@ -0,0 +1,57 @@
+# Pruebas de las particiones por proveedor en disco
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from motor_venta_perdida import EDAD_MAXIMA_TEMPORAL, escribir_particiones, leer_particion, nombre_particion
+
+def contenido(directorio):
+    return sorted(os.listdir(directorio))
+
+def test_nombre_particion():
+    assert nombre_particion(' pmi ') == 'PMI'
+    assert nombre_particion('Philip Morris / MX') == 'PHILIP_MORRIS_MX'
+
+def test_escribir_y_leer_por_proveedor(tmp_path, datos):
+    carpeta = str(tmp_path / 'v1')
+    escribir_particiones(*datos, carpeta)
+    assert contenido(os.path.join(carpeta, 'venta_perdida')) == ['BAT.parquet', 'JTI.parquet', 'PMI.parquet']
+
+    VENTA_PERDIDA, VENTA = leer_particion(carpeta, 'PMI')
+    assert set(VENTA_PERDIDA['PROVEEDOR']) == {'PMI'} and len(VENTA_PERDIDA) == 3
+    assert VENTA['Venta Neta Total'].sum() == 2300
+    assert leer_particion(carpeta, 'XYZ') is None
+
+def test_proveedor_solo_bye_no_tiene_datos(tmp_path, datos):
+    # JTI solo tiene filas BYE, que todos los filtros quitan
+    carpeta = str(tmp_path / 'v1')
+    escribir_particiones(*datos, carpeta)
+    assert leer_particion(carpeta, 'JTI') is None
+
+def test_escritura_fallida_no_deja_temporales(tmp_path, datos, monkeypatch):
+    def disco_lleno(self, *args, **kwargs):
+        raise OSError('disco lleno')
+    monkeypatch.setattr(pd.DataFrame, 'to_parquet', disco_lleno)
+    with pytest.raises(OSError, match='disco lleno'):
+        escribir_particiones(*datos, str(tmp_path / 'v1'))
+    assert contenido(tmp_path) == []
+
+def test_otra_sesion_ya_escribio_la_version(tmp_path, datos):
+    carpeta = str(tmp_path / 'v1')
+    escribir_particiones(*datos, carpeta)
+    escribir_particiones(*datos, carpeta)
+    assert contenido(tmp_path) == ['v1']
+
+def test_borra_versiones_anteriores_y_temporales_abandonados(tmp_path, datos):
+    (tmp_path / 'v0').mkdir()
+    abandonada = tmp_path / '.escribiendo-abandonada'
+    abandonada.mkdir()
+    antes = time.time() - EDAD_MAXIMA_TEMPORAL - 60
+    os.utime(abandonada, (antes, antes))
+    # Reciente: puede ser la escritura en curso de otra sesión
+    (tmp_path / '.escribiendo-en-curso').mkdir()
+
+    escribir_particiones(*datos, str(tmp_path / 'v1'))
+    assert contenido(tmp_path) == ['.escribiendo-en-curso', 'v1']
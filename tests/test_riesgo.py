@@ -0,0 +1,71 @@
+# Pruebas del puntaje de riesgo de desabasto
+import numpy as np
+import pandas as pd
+import pytest
+
+from motor_venta_perdida import COLUMNAS_RIESGO, HORIZONTE_RIESGO, IndiceMaster, riesgo_desabasto
+
+@pytest.fixture
+def indice():
+    return IndiceMaster(pd.DataFrame({'ARTICULO': [1, 2], 'DESCRIPCIÓN': ['MARLBORO ROJO', 'PALL MALL AZUL']}))
+
+def historia(tienda, articulo, dias_desabasto, inventario_uds, venta_uds, inventario_pesos, venta_pesos, dias=7):
+    # Una fila por día hasta el corte (2025-01-07); el desabasto cae en los últimos `dias_desabasto` días
+    fechas = pd.date_range('2025-01-07', periods=dias, freq='-1D')[::-1]
+    return pd.DataFrame({
+        'Fecha': fechas,
+        'NUM_TIENDA': tienda,
+        'NOMBRE_TIENDA': f'Tienda {tienda}',
+        'PLAZA': 'Puebla',
+        'MERCADO': '930',
+        'ARTICULO': articulo,
+        'ESTATUS': ['DESABASTO' if i >= dias - dias_desabasto else 'SURTIDO' for i in range(dias)],
+        'INVENTARIO_UDS': inventario_uds,
+        'VENTA_UDS_PTD': venta_uds,
+        'INVENTARIO_PESOS': inventario_pesos,
+        'VENTA_PESOS_PTD': venta_pesos,
+    })
+
+@pytest.fixture
+def venta_perdida():
+    return pd.concat([
+        # Sin inventario y en desabasto toda la semana: riesgo 1
+        historia(1, 1, dias_desabasto=7, inventario_uds=0, venta_uds=2, inventario_pesos=0, venta_pesos=100),
+        # Media cobertura (3.5 de 7 días) y desabasto 3 de 7 días
+        historia(2, 1, dias_desabasto=3, inventario_uds=7, venta_uds=2, inventario_pesos=350, venta_pesos=100),
+        # Nunca en desabasto: sin riesgo
+        historia(3, 2, dias_desabasto=0, inventario_uds=0, venta_uds=2, inventario_pesos=0, venta_pesos=100),
+        # Sin venta: cobertura infinita
+        historia(4, 2, dias_desabasto=7, inventario_uds=0, venta_uds=0, inventario_pesos=0, venta_pesos=0),
+    ], ignore_index=True)
+
+def test_riesgo_cobertura_y_recurrencia(venta_perdida, indice):
+    ranking = riesgo_desabasto(venta_perdida, indice)
+    assert list(ranking.columns) == COLUMNAS_RIESGO
+    assert ranking['NUM_TIENDA'].tolist() == [1, 2]
+    assert ranking['DESCRIPCIÓN'].tolist() == ['MARLBORO ROJO', 'MARLBORO ROJO']
+
+    primera, segunda = ranking.iloc[0], ranking.iloc[1]
+    assert primera['Días de cobertura'] == 0 and primera['Riesgo'] == 1
+    assert primera['VP esperada próxima semana'] == HORIZONTE_RIESGO * 100
+
+    assert segunda['Días de cobertura'] == 3.5
+    assert segunda['Días en desabasto'] == 3
+    assert np.isclose(segunda['Riesgo'], (1 - 3.5 / HORIZONTE_RIESGO) * 3 / 7)
+    assert np.isclose(segunda['VP esperada próxima semana'], segunda['Riesgo'] * (HORIZONTE_RIESGO * 100 - 350))
+
+def test_riesgo_ignora_desabasto_fuera_de_la_ventana(venta_perdida, indice):
+    # Desabasto de hace dos semanas no cuenta para la recurrencia
+    vieja = historia(3, 2, dias_desabasto=7, inventario_uds=0, venta_uds=2, inventario_pesos=0, venta_pesos=100)
+    vieja['Fecha'] -= pd.Timedelta(days=14)
+    ranking = riesgo_desabasto(pd.concat([venta_perdida, vieja], ignore_index=True), indice)
+    assert 3 not in ranking['NUM_TIENDA'].tolist()
+
+def test_riesgo_solo_los_k_mayores(venta_perdida, indice):
+    ranking = riesgo_desabasto(venta_perdida, indice, max_articulos=1)
+    assert ranking['NUM_TIENDA'].tolist() == [1]
+
+def test_riesgo_sin_datos(indice):
+    vacio = riesgo_desabasto(historia(1, 1, 0, 0, 0, 0, 0).iloc[:0], indice)
+    assert vacio.empty
+    assert list(vacio.columns) == COLUMNAS_RIESGO
@@ -0,0 +1,85 @@
+# Pruebas del motor de tendencias (media móvil, Δ semanal y z-score incrementales)
+import numpy as np
+import pandas as pd
+
+from motor_venta_perdida import estado_tendencia_vacio, media_movil_sobre_total, tendencias_al_dia
+
+def semanal(semanas, vp, vn):
+    df_vp = pd.DataFrame({'Semana Contable': semanas, 'VENTA_PERDIDA_PESOS': vp})
+    df_v = pd.DataFrame({'Semana Contable': semanas, 'Venta Neta Total': vn})
+    return df_vp, df_v
+
+def test_tendencias_sin_semanas_en_comun():
+    df_vp, _ = semanal(['2025-Sem 50'], [1], [10])
+    _, df_v = semanal(['2025-Sem 51'], [1], [10])
+    larga = tendencias_al_dia(estado_tendencia_vacio(), 'v1', df_vp, df_v, None)
+    assert larga.empty
+    assert '% Venta Perdida' in larga.columns
+
+def test_tendencias_recalcula_semana_con_datos_tardios():
+    semanas = [f'2025-Sem {semana}' for semana in range(40, 50)]
+    df_vp, df_v = semanal(semanas, [10] * 10, [100] * 10)
+    estado = estado_tendencia_vacio()
+    tendencias_al_dia(estado, 'v1', df_vp, df_v, None)
+
+    # Llega tarde un CSV de una semana ya conocida: misma etiqueta, otros datos
+    tarde = pd.concat([df_vp, pd.DataFrame({'Semana Contable': ['2025-Sem 45'], 'VENTA_PERDIDA_PESOS': [40]})])
+    incremental = tendencias_al_dia(estado, 'v2', tarde, df_v, None)
+    completa = tendencias_al_dia(estado_tendencia_vacio(), 'v2', tarde, df_v, None)
+
+    pd.testing.assert_frame_equal(incremental.reset_index(drop=True), completa.reset_index(drop=True))
+    assert incremental.loc[incremental['Semana Contable'] == '2025-Sem 45', '% Venta Perdida'].item() == 50
+
+def test_tendencias_misma_version_no_recalcula():
+    df_vp, df_v = semanal(['2025-Sem 50', '2025-Sem 51'], [10, 20], [100, 100])
+    estado = estado_tendencia_vacio()
+    primera = tendencias_al_dia(estado, 'v1', df_vp, df_v, None)
+    assert tendencias_al_dia(estado, 'v1', df_vp.iloc[:0], df_v.iloc[:0], None) is primera
+
+def test_tendencias_semana_nueva_igual_a_recalculo():
+    rng = np.random.default_rng(1)
+    semanas = [f'2025-Sem {semana}' for semana in range(40, 50)]
+    filas = pd.DataFrame([(semana, plaza) for semana in semanas for plaza in ['Puebla', 'Jalisco']],
+                         columns=['Semana Contable', 'PLAZA'])
+    df_vp = filas.assign(VENTA_PERDIDA_PESOS=rng.integers(1, 50, len(filas)))
+    df_v = filas.assign(**{'Venta Neta Total': rng.integers(500, 900, len(filas))})
+
+    estado = estado_tendencia_vacio()
+    tendencias_al_dia(estado, 'v1', df_vp.iloc[:-2], df_v.iloc[:-2], 'PLAZA')
+    incremental = tendencias_al_dia(estado, 'v2', df_vp, df_v, 'PLAZA')
+    completa = tendencias_al_dia(estado_tendencia_vacio(), 'v2', df_vp, df_v, 'PLAZA')
+    pd.testing.assert_frame_equal(incremental.reset_index(drop=True), completa.reset_index(drop=True))
+
+def test_tendencias_estadisticas():
+    semanas = [f'2025-Sem {semana}' for semana in range(40, 46)]
+    df_vp, df_v = semanal(semanas, [1, 2, 3, 4, 5, 12], [100] * 6)
+    larga = tendencias_al_dia(estado_tendencia_vacio(), 'v1', df_vp, df_v, None).set_index('Semana Contable')
+    ultima = larga.loc['2025-Sem 45']
+    assert ultima['% Venta Perdida'] == 12
+    assert ultima['Media móvil 4 sem'] == np.mean([3, 4, 5, 12])
+    assert ultima['Δ semanal'] == 7
+    # z-score contra las 4 semanas previas (2..5)
+    previas = np.array([2, 3, 4, 5])
+    assert np.isclose(ultima['z-score'], (12 - previas.mean()) / previas.std(ddof=1))
+
+def test_media_movil_sobre_total():
+    # Participación de cada proveedor en la Venta Neta total, como la grafica el tablero
+    semanas = [f'2025-Sem {semana}' for semana in range(40, 45)]
+    filas = pd.DataFrame([(semana, proveedor) for semana in semanas for proveedor in ['PMI', 'BAT']],
+                         columns=['Semana Contable', 'PROVEEDOR'])
+    df_vp = filas.assign(VENTA_PERDIDA_PESOS=np.where(filas['PROVEEDOR'] == 'PMI', 10, 30))
+    df_v = filas.assign(**{'Venta Neta Total': np.where(filas['PROVEEDOR'] == 'PMI', 100, 900)})
+    # BAT sin Venta Perdida en la última semana
+    df_vp = df_vp.iloc[:-1]
+
+    media = media_movil_sobre_total(
+        tendencias_al_dia(estado_tendencia_vacio(), 'v1', df_vp, df_v, 'PROVEEDOR'),
+        tendencias_al_dia(estado_tendencia_vacio(), 'v1', df_vp, df_v, None),
+    ).set_index(['SERIE', 'Semana Contable'])['Media móvil 4 sem']
+    assert np.allclose(media.loc['PMI'], 1)
+    assert np.allclose(media.loc['BAT'], 3)
+    assert ('BAT', '2025-Sem 44') not in media.index
+
+def test_media_movil_sobre_total_sin_datos():
+    vacia = tendencias_al_dia(estado_tendencia_vacio(), 'v1', *semanal([], [], []), None)
+    assert list(media_movil_sobre_total(vacia, vacia).columns) == ['SERIE', 'Semana Contable', 'Media móvil 4 sem']